@@ -0,0 +1,246 @@
+"""Process-wide admission control for scrape work.
+
+Static fetches and browser renders draw from separate lanes, each with a
+fixed number of slots and a bounded wait queue. Waiting requests are served
+round-robin by client, so one caller's burst cannot starve the others, and
+no client may hold more than its share of a queue. Every request carries a
+deadline; queued work whose deadline passes is dropped instead of run late.
+
+Rejections are raised as AdmissionRejected and become fast 429 (client over
+its share) or 503 (lane full, deadline passed) responses with Retry-After.
+Cache hits never reach a lane.
+"""
+import asyncio
+import ipaddress
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Union
+
+from browser_pool import BROWSER_POOL_SIZE
+import metrics
+from config import env_float, env_int, env_list
+from timings import record
+
+# Concurrent static fetches / browser renders in this process, and how many more may wait
+ADMISSION_STATIC_CAPACITY = env_int('ADMISSION_STATIC_CAPACITY', 64)
+ADMISSION_STATIC_QUEUE = env_int('ADMISSION_STATIC_QUEUE', 256)
+ADMISSION_BROWSER_CAPACITY = env_int('ADMISSION_BROWSER_CAPACITY', BROWSER_POOL_SIZE)
+ADMISSION_BROWSER_QUEUE = env_int('ADMISSION_BROWSER_QUEUE', 32)
+# Largest share of a lane's queue one client may occupy
+ADMISSION_CLIENT_SHARE = env_float('ADMISSION_CLIENT_SHARE', 0.5)
+# Seconds a request (a whole batch for /api/scrape/batch) may take before its queued work is dropped
+ADMISSION_TIMEOUT = env_float('ADMISSION_TIMEOUT', 60.0)
+ADMISSION_BATCH_TIMEOUT = env_float('ADMISSION_BATCH_TIMEOUT', 600.0)
+# Proxies (addresses or CIDR networks) whose X-Client-Id / X-Forwarded-For headers are believed
+ADMISSION_TRUSTED_PROXIES = env_list('ADMISSION_TRUSTED_PROXIES', [])
+
+# Client used for work that no request started (background refreshes)
+INTERNAL_CLIENT = 'internal'
+
+
+class AdmissionRejected(Exception):
+    """Raised when a lane cannot take more work; carries the HTTP status to answer with"""
+
+    def __init__(self, lane: str, reason: str, status: int, retry_after: int):
+        super().__init__(f"Too much {lane} work queued ({reason}), retry in {retry_after}s")
+        self.lane = lane
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Ticket:
+    client: str
+    deadline: float  # time.monotonic()
+
+    @property
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+_ticket: ContextVar[Optional[Ticket]] = ContextVar('admission_ticket', default=None)
+
+
+@contextmanager
+def admitted_as(client: str, timeout: float = ADMISSION_TIMEOUT):
+    """Attribute the scrape work started inside the block to a client, with a deadline"""
+    token = _ticket.set(Ticket(client, time.monotonic() + max(0.0, timeout)))
+    try:
+        yield
+    finally:
+        _ticket.reset(token)
+
+
+def _networks(entries: List[str]) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    networks = []
+    for entry in entries:
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            print(f"Warning: ignoring invalid ADMISSION_TRUSTED_PROXIES entry: {entry!r}")
+    return networks
+
+
+_trusted_proxies = _networks(ADMISSION_TRUSTED_PROXIES)
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_proxies)
+
+
+def client_identity(peer: Optional[str], client_id: Optional[str] = None, forwarded_for: Optional[str] = None) -> str:
+    """Who a request counts against for fair sharing.
+
+    Callers choose their own headers, so X-Client-Id and X-Forwarded-For are
+    only believed when the connection comes from a trusted proxy; otherwise
+    the connection address decides. Through a proxy, the client is the
+    nearest X-Forwarded-For address that is not itself a trusted proxy.
+    """
+    peer = peer or 'unknown'
+    if not _is_trusted(peer):
+        return peer
+    if client_id and client_id.strip():
+        return client_id.strip()[:128]
+    if forwarded_for:
+        for address in reversed([part.strip() for part in forwarded_for.split(',') if part.strip()]):
+            if not _is_trusted(address):
+                return address[:128]
+    return peer
+
+
+def current_ticket() -> Ticket:
+    ticket = _ticket.get()
+    return ticket if ticket is not None else Ticket(INTERNAL_CLIENT, time.monotonic() + ADMISSION_TIMEOUT)
+
+
+class Lane:
+    """Slots for one kind of work, with a per-client round-robin wait queue"""
+
+    def __init__(self, name: str, capacity: int, queue_limit: int, client_share: float = ADMISSION_CLIENT_SHARE):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.queue_limit = max(0, queue_limit)
+        self.client_limit = max(1, math.floor(self.queue_limit * client_share))
+        self.in_use = 0
+        self.queued = 0
+        # client -> its waiters, oldest first; clients are served in rotation
+        self._queues: 'OrderedDict[str, Deque[asyncio.Future]]' = OrderedDict()
+        # Moving average of how long a slot is held, for Retry-After
+        self._hold_seconds = 1.0
+        self.counters = {'admitted': 0, 'waited': 0, 'queueFull': 0, 'clientShare': 0, 'deadline': 0}
+
+    def retry_after(self) -> int:
+        """Rough seconds until the queue ahead of a new request drains"""
+        return max(1, math.ceil(self._hold_seconds * (self.queued + 1) / self.capacity))
+
+    def _reject(self, reason: str, status: int) -> AdmissionRejected:
+        self.counters[reason] += 1
+        metrics.admission_rejections.inc(lane=self.name, reason=reason)
+        return AdmissionRejected(self.name, reason, status, self.retry_after())
+
+    async def acquire(self, ticket: Ticket) -> bool:
+        """Take a slot, waiting in the queue if needed; True if the request had to wait"""
+        if ticket.remaining <= 0:
+            raise self._reject('deadline', 503)
+        if self.in_use < self.capacity and not self.queued:
+            self.in_use += 1
+            self.counters['admitted'] += 1
+            return False
+        if self.queued >= self.queue_limit:
+            raise self._reject('queueFull', 503)
+        waiters = self._queues.get(ticket.client)
+        if waiters is not None and len(waiters) >= self.client_limit:
+            raise self._reject('clientShare', 429)
+
+        waiter = asyncio.get_running_loop().create_future()
+        if waiters is None:
+            waiters = self._queues[ticket.client] = deque()
+        waiters.append(waiter)
+        self.queued += 1
+        self.counters['waited'] += 1
+        try:
+            await asyncio.wait_for(waiter, timeout=ticket.remaining)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended: pass it on
+                self.release()
+            else:
+                self._forget(ticket.client, waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject('deadline', 503)
+        self.counters['admitted'] += 1
+        return True
+
+    def _forget(self, client: str, waiter: asyncio.Future) -> None:
+        waiters = self._queues.get(client)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self.queued -= 1
+            if not waiters:
+                del self._queues[client]
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        if held_seconds is not None:
+            self._hold_seconds += 0.2 * (held_seconds - self._hold_seconds)
+        while self._queues:
+            client, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            if not waiter.done():
+                # Hand the slot straight to the next client in rotation
+                waiter.set_result(None)
+                return
+        self.in_use -= 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'capacity': self.capacity,
+            'inUse': self.in_use,
+            'queued': self.queued,
+            'queueLimit': self.queue_limit,
+            'queuedClients': len(self._queues),
+            'retryAfter': self.retry_after(),
+            **self.counters,
+        }
+
+
+class AdmissionController:
+    def __init__(self):
+        self.lanes = {
+            'static': Lane('static', ADMISSION_STATIC_CAPACITY, ADMISSION_STATIC_QUEUE),
+            'browser': Lane('browser', ADMISSION_BROWSER_CAPACITY, ADMISSION_BROWSER_QUEUE),
+        }
+
+    @asynccontextmanager
+    async def slot(self, kind: str):
+        """Hold a slot of the 'static' or 'browser' lane for the current request's client"""
+        lane = self.lanes[kind]
+        started = time.perf_counter()
+        waited = await lane.acquire(current_ticket())
+        acquired = time.perf_counter()
+        if waited:
+            record(f"queue.{kind}", (acquired - started) * 1000)
+        try:
+            yield
+        finally:
+            lane.release(time.perf_counter() - acquired)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+controller = AdmissionController()
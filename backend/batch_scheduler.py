@@ -0,0 +1,131 @@
+"""Bounded, domain-aware scheduling for batch scrapes with results streamed as they complete"""
+import asyncio
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from itertools import islice
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from admission import controller
+from config import env_int
+from models import ScrapeResult
+from timings import record
+from urls import domain_of
+
+# URLs of one batch scraped at the same time
+BATCH_CONCURRENCY = env_int('BATCH_CONCURRENCY', 16)
+# Politeness: URLs of one batch hitting the same domain at the same time
+BATCH_PER_DOMAIN = env_int('BATCH_PER_DOMAIN', 2)
+# Items of one batch allowed in the static fetch / browser render stage at once
+BATCH_STATIC_CONCURRENCY = env_int('BATCH_STATIC_CONCURRENCY', 16)
+BATCH_BROWSER_CONCURRENCY = env_int('BATCH_BROWSER_CONCURRENCY', 2)
+# How far ahead in the queue to look for a URL whose domain has a free slot
+_SCHEDULING_WINDOW = 256
+
+_budgets: ContextVar[Optional[Dict[str, asyncio.Semaphore]]] = ContextVar('batch_budgets', default=None)
+
+
+@asynccontextmanager
+async def work_slot(kind: str):
+    """Hold one unit of the current batch's 'static' or 'browser' budget, then a process-wide admission slot.
+
+    Outside a batch there is no budget, only the admission slot.
+    """
+    budgets = _budgets.get()
+    semaphore = budgets.get(kind) if budgets else None
+    if semaphore is None:
+        async with controller.slot(kind):
+            yield
+        return
+    started = time.perf_counter()
+    async with semaphore:
+        record(f"queue.{kind}", (time.perf_counter() - started) * 1000)
+        async with controller.slot(kind):
+            yield
+
+
+@dataclass
+class BatchItem:
+    index: int
+    url: str
+    result: ScrapeResult
+    elapsed_ms: float
+
+
+class BatchScheduler:
+    """Runs a batch through a fixed set of workers and yields results as they finish.
+
+    Memory stays bounded: only `concurrency` scrapes run at once and the
+    output queue holds at most twice that many finished items, so a slow
+    consumer applies backpressure to the workers.
+    """
+
+    def __init__(
+        self,
+        scrape: Callable[[str], Awaitable[ScrapeResult]],
+        concurrency: int = BATCH_CONCURRENCY,
+        per_domain: int = BATCH_PER_DOMAIN,
+        static_concurrency: int = BATCH_STATIC_CONCURRENCY,
+        browser_concurrency: int = BATCH_BROWSER_CONCURRENCY,
+    ):
+        self.scrape = scrape
+        self.concurrency = max(1, concurrency)
+        self.per_domain = max(1, per_domain)
+        self.static_concurrency = max(1, static_concurrency)
+        self.browser_concurrency = max(1, browser_concurrency)
+
+    async def run(self, urls: List[str]) -> AsyncIterator[BatchItem]:
+        if not urls:
+            return
+
+        pending = deque(enumerate(urls))
+        active: Counter = Counter()
+        changed = asyncio.Condition()
+        finished: 'asyncio.Queue[BatchItem]' = asyncio.Queue(maxsize=self.concurrency * 2)
+        budgets = {
+            'static': asyncio.Semaphore(self.static_concurrency),
+            'browser': asyncio.Semaphore(self.browser_concurrency),
+        }
+
+        async def next_item():
+            async with changed:
+                while pending:
+                    for position, (index, url) in enumerate(islice(pending, _SCHEDULING_WINDOW)):
+                        domain = domain_of(url)
+                        if active[domain] < self.per_domain:
+                            del pending[position]
+                            active[domain] += 1
+                            return index, url, domain
+                    await changed.wait()
+                return None
+
+        async def worker():
+            _budgets.set(budgets)
+            while True:
+                item = await next_item()
+                if item is None:
+                    return
+                index, url, domain = item
+                started = time.perf_counter()
+                try:
+                    result = await self.scrape(url)
+                except Exception as e:
+                    result = ScrapeResult(url=url, success=False, error=str(e) or "Unknown error occurred while scraping the website")
+                finally:
+                    async with changed:
+                        active[domain] -= 1
+                        if not active[domain]:
+                            del active[domain]
+                        changed.notify_all()
+                await finished.put(BatchItem(index, url, result, round((time.perf_counter() - started) * 1000, 1)))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(urls)))]
+        try:
+            for _ in range(len(urls)):
+                yield await finished.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
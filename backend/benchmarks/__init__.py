@@ -0,0 +1 @@
+"""Offline benchmark suite; run `python -m benchmarks --help` from the backend directory"""
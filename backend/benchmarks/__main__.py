@@ -0,0 +1,200 @@
+"""Command line entry point.
+
+    python -m benchmarks run [--only parse,pool,accuracy,static,browser] [--repeat N] [--latency-ms MS]
+    python -m benchmarks serve [--port 8765] [--latency-ms MS] [--jitter-ms MS]
+    python -m benchmarks compare BASELINE.json CANDIDATE.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+RUNNERS = ('parse', 'pool', 'accuracy', 'static', 'browser')
+
+# Metrics shown by `compare`, and whether a larger value is better
+_COMPARED = {
+    'mbPerSecond': True,
+    'pagesPerSecond': True,
+    'p50': False,
+    'p95': False,
+    'p99': False,
+    'selfMb': False,
+    'childrenMb': False,
+    'accuracy': True,
+}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def _accuracy_summary(rows: List[Dict[str, object]]) -> Dict[str, object]:
+    return {'accuracy': round(sum(row['ok'] for row in rows) / len(rows), 3) if rows else None, 'pages': len(rows)}
+
+
+def _print_accuracy(rows: List[Dict[str, object]]) -> None:
+    print(f"{'page':<24} {'path':<9} {'expected':<9} {'found':<6} {'tier':<10} result")
+    for row in rows:
+        result = 'ok' if row['ok'] else 'MISMATCH ' + ', '.join(row['mismatches'])
+        print(f"{row['page']:<24} {row['path']:<9} {str(row['expectedFound']):<9} {str(row['found']):<6} "
+              f"{str(row['parserTier']):<10} {result}")
+
+
+async def _run(args) -> Dict[str, object]:
+    from .corpus import load_corpus
+    from .runners import bench_accuracy, bench_browser, bench_parse, bench_parse_pool, bench_static, peak_rss
+    from .server import start_server
+
+    only = set(args.only.split(',')) if args.only else {'parse', 'pool', 'accuracy', 'static'}
+    corpus = load_corpus()
+    server = start_server(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, corpus=corpus)
+    base_url = f"{server.base_url}/pages/"
+    results: Dict[str, object] = {
+        'meta': {
+            'label': args.label,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'corpusVersion': corpus.version,
+            'repeat': args.repeat,
+            'latencyMs': args.latency_ms,
+            'jitterMs': args.jitter_ms,
+        },
+    }
+    accuracy: List[Dict[str, object]] = []
+    try:
+        if 'parse' in only:
+            print("Measuring parse throughput...")
+            results['parse'] = bench_parse(corpus, base_url, args.parse_seconds)
+        if 'pool' in only:
+            print("Measuring parse pool throughput...")
+            results['pool'] = await bench_parse_pool(corpus, base_url)
+        if 'accuracy' in only:
+            accuracy += bench_accuracy(corpus, base_url)
+        if 'static' in only:
+            print("Measuring static end-to-end latency...")
+            static = await bench_static(corpus, server, args.repeat)
+            accuracy += static.pop('accuracy')
+            results['static'] = static
+        if 'browser' in only:
+            print("Measuring Playwright end-to-end latency...")
+            browser = await bench_browser(corpus, server, args.repeat)
+            accuracy += browser.pop('accuracy', [])
+            results['browser'] = browser
+    finally:
+        server.shutdown()
+        from http_pool import close_http_pool
+        from parse_pool import close_parse_pool
+        await close_http_pool()
+        close_parse_pool()
+
+    if accuracy:
+        results['accuracy'] = {
+            'summary': {path: _accuracy_summary([row for row in accuracy if row['path'] == path])
+                        for path in dict.fromkeys(row['path'] for row in accuracy)},
+            'rows': accuracy,
+        }
+    results['rss'] = peak_rss()
+    return results
+
+
+def _flatten(value, prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix] = value
+    return flat
+
+
+def compare(baseline: Dict[str, object], candidate: Dict[str, object]) -> None:
+    """Print the headline metrics of two runs side by side"""
+    before = _flatten({key: value for key, value in baseline.items() if key != 'meta'})
+    after = _flatten({key: value for key, value in candidate.items() if key != 'meta'})
+    print(f"baseline:  {baseline['meta'].get('label') or ''} {baseline['meta']['revision']} {baseline['meta']['timestamp']}")
+    print(f"candidate: {candidate['meta'].get('label') or ''} {candidate['meta']['revision']} {candidate['meta']['timestamp']}")
+    print(f"{'metric':<52} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for key in before:
+        metric = key.rsplit('.', 1)[-1]
+        if metric not in _COMPARED or key not in after:
+            continue
+        old, new = before[key], after[key]
+        change = (new - old) / old * 100 if old else 0.0
+        better = (change > 0) == _COMPARED[metric]
+        marker = '' if abs(change) < 5 else (' +' if better else ' -')
+        print(f"{key:<52} {old:>12} {new:>12} {change:>+8.1f}%{marker}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Offline scraper benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run benchmarks and save the results as JSON')
+    run.add_argument('--only', help=f"comma-separated runners from {', '.join(RUNNERS)} "
+                                    "(default: all but browser)")
+    run.add_argument('--repeat', type=int, default=5, help='end-to-end scrapes per page and scenario')
+    run.add_argument('--parse-seconds', type=float, default=0.5, help='time spent parsing each page')
+    run.add_argument('--latency-ms', type=float, default=0.0, help='latency the stand-in server adds to every response')
+    run.add_argument('--jitter-ms', type=float, default=0.0, help='random extra latency, up to this much')
+    run.add_argument('--label', default='', help='name stored with the results')
+    run.add_argument('--output', help='results file (default: benchmarks/results/<timestamp>.json)')
+
+    serve = commands.add_parser('serve', help='serve the corpus over HTTP')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency-ms', type=float, default=0.0)
+    serve.add_argument('--jitter-ms', type=float, default=0.0)
+
+    diff = commands.add_parser('compare', help='compare two results files')
+    diff.add_argument('baseline')
+    diff.add_argument('candidate')
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        compare(baseline, candidate)
+        return
+
+    if args.command == 'serve':
+        from .server import start_server
+        server = start_server(args.host, args.port, args.latency_ms, args.jitter_ms)
+        print(f"Serving the fixture corpus on {server.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    results = asyncio.run(_run(args))
+    if 'accuracy' in results:
+        _print_accuracy(results['accuracy']['rows'])
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    main()
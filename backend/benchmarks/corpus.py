@@ -0,0 +1,87 @@
+"""Fixture corpus: saved login pages and homepages described by corpus/manifest.json"""
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+# Filler for generated pages: product cards like a large catalog or search result page
+_PADDING_CARD = (
+    '<div class="product-card" data-sku="{index:07d}"><a href="/p/{index}">'
+    '<img src="/img/{index}.jpg" alt="Item {index}"></a><h3>Item {index}</h3>'
+    '<p class="price">${price}.99</p><button type="button" class="add-to-cart">Add to cart</button></div>\n'
+)
+
+
+@dataclass
+class Page:
+    name: str
+    kind: str
+    html: str
+    expected: Dict[str, object]
+    # Expectations where a different path sees a different page
+    expected_browser: Optional[Dict[str, object]] = None
+    expected_end_to_end: Optional[Dict[str, object]] = None
+    notes: str = ''
+
+    @property
+    def size(self) -> int:
+        return len(self.html.encode('utf-8'))
+
+
+@dataclass
+class Corpus:
+    version: int
+    pages: List[Page]
+    aliases: Dict[str, str] = field(default_factory=dict)
+
+    def get(self, name: str) -> Optional[Page]:
+        for page in self.pages:
+            if page.name == name:
+                return page
+        return None
+
+
+def _padding(size: int) -> str:
+    cards = []
+    total = 0
+    index = 0
+    while total < size:
+        card = _PADDING_CARD.format(index=index, price=index % 90 + 9)
+        cards.append(card)
+        total += len(card)
+        index += 1
+    return ''.join(cards)
+
+
+def _generate(spec: Dict[str, object]) -> str:
+    with open(os.path.join(CORPUS_DIR, spec['base']), encoding='utf-8') as f:
+        base = f.read()
+    padding = f'<section class="catalog">\n{_padding(int(spec["paddingBytes"]))}</section>\n'
+    if spec.get('position', 'before') == 'before':
+        return base.replace('<main', padding + '<main', 1) if '<main' in base else base.replace('<body>', '<body>' + padding, 1)
+    return base.replace('</body>', padding + '</body>', 1)
+
+
+def load_corpus(directory: str = CORPUS_DIR) -> Corpus:
+    """Read the manifest and every page it lists, generating the large ones"""
+    with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    pages = []
+    for entry in manifest['pages']:
+        if 'generate' in entry:
+            html = _generate(entry['generate'])
+        else:
+            with open(os.path.join(directory, entry['file']), encoding='utf-8') as f:
+                html = f.read()
+        pages.append(Page(
+            name=entry['name'],
+            kind=entry['kind'],
+            html=html,
+            expected=entry['expected'],
+            expected_browser=entry.get('expectedBrowser'),
+            expected_end_to_end=entry.get('expectedEndToEnd'),
+            notes=entry.get('notes', ''),
+        ))
+    return Corpus(version=manifest['version'], pages=pages, aliases=manifest.get('aliases', {}))
@@ -0,0 +1,213 @@
+"""Benchmark runners: parse throughput, detection accuracy and end-to-end latency"""
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from detector import detect
+from models import AuthComponent
+
+from .corpus import Corpus, Page
+from .server import StandInServer
+
+# Request variants the static end-to-end runner puts every page through
+STATIC_SCENARIOS = {
+    'plain': '',
+    'redirects': 'redirects=3',
+    'captcha': 'block=captcha',
+    'forbidden': 'block=403',
+    'js-only': 'js=1',
+}
+
+
+def _fresh_discovery_cache():
+    """Point main at an empty login URL cache so one page's discovery cannot leak into the next"""
+    import main
+    from discovery_cache import DiscoveryCache
+
+    main._discovery_cache = DiscoveryCache(os.path.join(tempfile.mkdtemp(prefix='bench-discovery-'), 'discovery.sqlite3'))
+    if hasattr(main._renderer, 'discovery_cache'):
+        main._renderer.discovery_cache = main._discovery_cache
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Nearest-rank percentiles of latencies in milliseconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))], 2)
+
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 2),
+        'min': round(ordered[0], 2),
+        'p50': rank(50),
+        'p95': rank(95),
+        'p99': rank(99),
+        'max': round(ordered[-1], 2),
+    }
+
+
+def peak_rss() -> Dict[str, float]:
+    """Peak resident memory of this process and of its reaped children (parse workers, browser)"""
+    per_mb = 1024 * 1024 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB elsewhere
+    return {
+        'selfMb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / per_mb, 1),
+        'childrenMb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / per_mb, 1),
+    }
+
+
+def check(expected: Dict[str, object], component: Optional[AuthComponent]) -> List[str]:
+    """Fields of a detection result that differ from the manifest's expectations"""
+    found = bool(component and component.found)
+    if found != expected.get('found'):
+        return [f"found={found}"]
+    if not found:
+        return []
+    mismatches = []
+    if 'method' in expected and component.method != expected['method']:
+        mismatches.append(f"method={component.method}")
+    if 'actionPath' in expected and urlsplit(component.action or '').path != expected['actionPath']:
+        mismatches.append(f"action={component.action}")
+    if 'username' in expected and bool(component.usernameInput) != expected['username']:
+        mismatches.append(f"username={bool(component.usernameInput)}")
+    if 'submit' in expected and bool(component.submitButton) != expected['submit']:
+        mismatches.append(f"submit={bool(component.submitButton)}")
+    return mismatches
+
+
+def _accuracy_row(page: Page, path: str, expected: Dict[str, object], component: Optional[AuthComponent]) -> Dict[str, object]:
+    mismatches = check(expected, component)
+    return {
+        'page': page.name,
+        'kind': page.kind,
+        'path': path,
+        'expectedFound': expected.get('found'),
+        'found': bool(component and component.found),
+        'parserTier': component.parserTier if component else None,
+        'ok': not mismatches,
+        'mismatches': mismatches,
+    }
+
+
+def bench_parse(corpus: Corpus, base_url: str, seconds_per_page: float = 0.5) -> Dict[str, object]:
+    """In-process detect() throughput per page and over the whole corpus"""
+    pages = {}
+    total_bytes = 0
+    total_pages = 0
+    total_seconds = 0.0
+    for page in corpus.pages:
+        iterations = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while iterations < 3 or elapsed < seconds_per_page:
+            component = detect(page.html, base_url)
+            iterations += 1
+            elapsed = time.perf_counter() - started
+        pages[page.name] = {
+            'bytes': page.size,
+            'iterations': iterations,
+            'meanMs': round(elapsed / iterations * 1000, 3),
+            'pagesPerSecond': round(iterations / elapsed, 1),
+            'mbPerSecond': round(page.size * iterations / elapsed / 1e6, 2),
+            'parserTier': component.parserTier,
+        }
+        total_bytes += page.size * iterations
+        total_pages += iterations
+        total_seconds += elapsed
+    return {
+        'pages': pages,
+        'overall': {
+            'pagesPerSecond': round(total_pages / total_seconds, 1),
+            'mbPerSecond': round(total_bytes / total_seconds / 1e6, 2),
+        },
+    }
+
+
+async def bench_parse_pool(corpus: Corpus, base_url: str, rounds: int = 10) -> Dict[str, object]:
+    """Throughput of detect_offloaded with every page of `rounds` corpus passes in flight at once"""
+    from parse_pool import PARSE_POOL_MODE, PARSE_POOL_WORKERS, detect_offloaded, start_parse_pool
+
+    start_parse_pool()
+    # Let the workers spawn before timing
+    await detect_offloaded(corpus.pages[0].html, base_url)
+    pages = [page for _ in range(rounds) for page in corpus.pages]
+    started = time.perf_counter()
+    await asyncio.gather(*(detect_offloaded(page.html, base_url) for page in pages))
+    elapsed = time.perf_counter() - started
+    return {
+        'mode': PARSE_POOL_MODE,
+        'workers': PARSE_POOL_WORKERS,
+        'pages': len(pages),
+        'pagesPerSecond': round(len(pages) / elapsed, 1),
+        'mbPerSecond': round(sum(page.size for page in pages) / elapsed / 1e6, 2),
+    }
+
+
+def bench_accuracy(corpus: Corpus, base_url: str) -> List[Dict[str, object]]:
+    """Detector results on each saved page against the manifest"""
+    return [_accuracy_row(page, 'detector', page.expected, detect(page.html, base_url)) for page in corpus.pages]
+
+
+async def bench_static(corpus: Corpus, server: StandInServer, repeat: int = 5) -> Dict[str, object]:
+    """scrape_website latency per scenario with the browser disabled, plus end-to-end accuracy"""
+    import main
+    from renderer import LocalRenderer
+
+    # A renderer that was never started is unavailable, so every scrape stays static
+    main._renderer = LocalRenderer(main._discovery_cache)
+    main._router = main.Router()
+    scenarios = {}
+    accuracy = []
+    for scenario, query in STATIC_SCENARIOS.items():
+        samples = []
+        for page in corpus.pages:
+            url = f"{server.base_url}/pages/{page.name}" + (f"?{query}" if query else '')
+            result = None
+            _fresh_discovery_cache()
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = await main.scrape_website(url, 'no-store')
+                samples.append((time.perf_counter() - started) * 1000)
+            if scenario == 'plain':
+                expected = page.expected_end_to_end or page.expected
+                accuracy.append(_accuracy_row(page, 'static', expected, result.authComponent))
+        scenarios[scenario] = percentiles(samples)
+    return {'scenarios': scenarios, 'accuracy': accuracy}
+
+
+async def bench_browser(corpus: Corpus, server: StandInServer, repeat: int = 3) -> Dict[str, object]:
+    """Playwright render + detection latency per page, if a browser can be launched here"""
+    import main
+
+    await main.startup_event()
+    try:
+        if not main._renderer.available:
+            return {'skipped': 'Playwright browser unavailable'}
+        samples = []
+        accuracy = []
+        for page in corpus.pages:
+            url = f"{server.base_url}/pages/{page.name}"
+            component = None
+            _fresh_discovery_cache()
+            for _ in range(repeat):
+                started = time.perf_counter()
+                render = await main.scrape_with_playwright(url, login_candidates=[])
+                if render.auth_component is not None:
+                    component = render.auth_component
+                elif render.html:
+                    component = detect(render.html, url)
+                else:
+                    component = None
+                samples.append((time.perf_counter() - started) * 1000)
+            expected = page.expected_browser or page.expected
+            accuracy.append(_accuracy_row(page, 'browser', expected, component))
+        return {'latency': percentiles(samples), 'accuracy': accuracy}
+    finally:
+        await main.shutdown_event()
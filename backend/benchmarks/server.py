@@ -0,0 +1,153 @@
+"""Local stand-in web server for the fixture corpus.
+
+    /pages/<name>                 the page as saved
+    /pages/<name>?delay=250       extra latency in milliseconds
+    /pages/<name>?redirects=3     a chain of 302s before the page
+    /pages/<name>?block=captcha   an anti-bot response instead of the page
+                                  (captcha, 403, 429 or 503)
+    /pages/<name>?js=1            a JavaScript-only shell that renders the page client-side
+    /login, ...                   aliases from the manifest (what login path probes find)
+
+Every response also waits the server-wide latency (plus random jitter).
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from .corpus import Corpus, load_corpus
+
+_CAPTCHA_PAGE = (
+    '<html><head><title>Are you a robot?</title></head><body>'
+    '<p>Unusual traffic detected from your network. Complete the captcha to continue.</p>'
+    '<div class="g-recaptcha" data-sitekey="stand-in"></div></body></html>'
+)
+_BLOCK_PAGES = {
+    403: '<html><body><h1>Access denied</h1><p>You do not have permission to access this server.</p></body></html>',
+    429: '<html><body><h1>Too many requests</h1></body></html>',
+    503: '<html><body><h1>Service unavailable</h1><p>Checking your browser before accessing the site.</p></body></html>',
+}
+
+_JS_SHELL = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Loading...</title></head>
+<body><noscript>Please enable JavaScript to continue.</noscript><div id="root"></div>
+<script>
+document.addEventListener('DOMContentLoaded', function () {{
+    document.body.innerHTML = {body};
+}});
+</script></body></html>
+"""
+
+
+def _body_of(html: str) -> str:
+    lower = html.lower()
+    start = lower.find('<body')
+    end = lower.rfind('</body>')
+    if start == -1 or end == -1:
+        return html
+    return html[lower.find('>', start) + 1:end]
+
+
+def js_shell(html: str) -> str:
+    """Wrap a page so its content only exists after a script runs"""
+    # Keep "</script>" inside the string from closing the shell's script element
+    return _JS_SHELL.format(body=json.dumps(_body_of(html)).replace('</', '<\\/'))
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], corpus: Corpus, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        super().__init__(address, _Handler)
+        self.corpus = corpus
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandInServer
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, Nagle + delayed ACK add ~40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str, headers: Optional[dict] = None) -> None:
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+        delay_ms = server.latency_ms + float(query.get('delay', 0))
+        if server.jitter_ms:
+            delay_ms += random.uniform(0, server.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        path = parts.path
+        if path in server.corpus.aliases:
+            name = server.corpus.aliases[path]
+        elif path.startswith('/pages/'):
+            name = path[len('/pages/'):]
+        elif path == '/':
+            links = ''.join(f'<li><a href="/pages/{page.name}">{page.name}</a></li>' for page in server.corpus.pages)
+            self._send(200, f'<html><body><h1>Fixture corpus</h1><ul>{links}</ul></body></html>')
+            return
+        else:
+            self._send(404, '<html><body><h1>Not found</h1></body></html>')
+            return
+
+        page = server.corpus.get(name)
+        if page is None:
+            self._send(404, '<html><body><h1>Not found</h1></body></html>')
+            return
+
+        redirects = int(query.get('redirects', 0))
+        if redirects > 0:
+            query['redirects'] = str(redirects - 1)
+            self._send(302, '', {'Location': f"{path}?{urlencode(query)}"})
+            return
+
+        block = query.get('block')
+        if block == 'captcha':
+            self._send(200, _CAPTCHA_PAGE)
+            return
+        if block and block.isdigit() and int(block) in _BLOCK_PAGES:
+            status = int(block)
+            self._send(status, _BLOCK_PAGES[status], {'Retry-After': '5'} if status in (429, 503) else None)
+            return
+
+        self._send(200, js_shell(page.html) if query.get('js') else page.html)
+
+
+def start_server(host: str = '127.0.0.1', port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 corpus: Optional[Corpus] = None) -> StandInServer:
+    """Serve the corpus from a background thread; port 0 picks a free port"""
+    server = StandInServer((host, port), corpus or load_corpus(), latency_ms, jitter_ms)
+    thread = threading.Thread(target=server.serve_forever, name='stand-in-server', daemon=True)
+    thread.start()
+    return server
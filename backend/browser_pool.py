@@ -0,0 +1,205 @@
+"""Bounded pool of warm Playwright browser contexts for fallback scrapes"""
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Set
+from urllib.parse import urlsplit
+
+from playwright.async_api import Browser, BrowserContext, Page, Request
+
+from config import env_float, env_int
+from models import AuthComponent
+from request_blocking import BLOCK_REQUESTS, RequestBlocker
+from timings import stage
+
+# Maximum number of contexts (and therefore concurrent renders)
+BROWSER_POOL_SIZE = env_int('BROWSER_POOL_SIZE', 4)
+# Contexts created eagerly at startup
+BROWSER_POOL_WARM = env_int('BROWSER_POOL_WARM', 2)
+# Seconds a scrape may wait for a free context before giving up
+BROWSER_POOL_ACQUIRE_TIMEOUT = env_float('BROWSER_POOL_ACQUIRE_TIMEOUT', 30.0)
+# Recycle a context after this many scrapes to bound storage/memory growth
+BROWSER_POOL_MAX_USES = env_int('BROWSER_POOL_MAX_USES', 50)
+
+CONTEXT_OPTIONS: Dict[str, Any] = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'locale': 'en-US',
+}
+
+
+# Everything an origin can keep in the browser (CDP Storage.clearDataForOrigin)
+_CLEARED_STORAGE = 'all'
+
+
+class BrowserPoolTimeout(Exception):
+    """Raised when no browser context became free within the acquire timeout"""
+
+
+@dataclass
+class RenderResult:
+    """Output of one browser render"""
+    html: Optional[str] = None
+    stats: Dict[str, int] = field(default_factory=dict)
+    # Where the render ended up and how the login page was reached
+    # ('cache', 'link', 'common-path' or None when the URL was used as given)
+    final_url: Optional[str] = None
+    discovery: Optional[str] = None
+    # Set instead of `html` when detection ran inside the page (BROWSER_EXTRACTION=dom)
+    auth_component: Optional[AuthComponent] = None
+
+
+class PooledContext:
+    """A borrowed context/page pair; valid only inside BrowserContextPool.lease()"""
+
+    def __init__(self, context: BrowserContext, page: Page, blocker: Optional[RequestBlocker] = None):
+        self.context = context
+        self.page = page
+        self.blocker = blocker
+        self.uses = 0
+        # Origins whose documents loaded since the last reset (their storage is cleared on reset)
+        self.origins: Set[str] = set()
+
+    def note_request(self, request: Request) -> None:
+        if request.resource_type == 'document':
+            parts = urlsplit(request.url)
+            if parts.scheme in ('http', 'https'):
+                self.origins.add(f"{parts.scheme}://{parts.netloc}")
+
+    def stats(self) -> Dict[str, int]:
+        """Request-blocking counters for the current render"""
+        return self.blocker.stats.to_dict() if self.blocker else {}
+
+
+class BrowserContextPool:
+    """Hands out pre-configured context/page pairs and resets them between scrapes.
+
+    At most `size` contexts exist at once; callers beyond that wait in FIFO
+    order on a semaphore for up to `acquire_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        size: int = BROWSER_POOL_SIZE,
+        acquire_timeout: float = BROWSER_POOL_ACQUIRE_TIMEOUT,
+        max_uses: int = BROWSER_POOL_MAX_USES,
+    ):
+        self._browser = browser
+        self.size = max(1, size)
+        self.acquire_timeout = acquire_timeout
+        self.max_uses = max(1, max_uses)
+        self._slots = asyncio.Semaphore(self.size)
+        self._idle: Deque[PooledContext] = deque()
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+    async def _create(self) -> PooledContext:
+        context = await self._browser.new_context(**CONTEXT_OPTIONS)
+        blocker = None
+        if BLOCK_REQUESTS:
+            blocker = RequestBlocker()
+            await blocker.install(context)
+        page = await context.new_page()
+        entry = PooledContext(context, page, blocker)
+        context.on('request', entry.note_request)
+        return entry
+
+    async def _discard(self, entry: PooledContext) -> None:
+        try:
+            await entry.context.close()
+        except Exception as e:
+            print(f"Error closing browser context: {e}")
+
+    async def _clear_storage(self, entry: PooledContext) -> None:
+        """Drop localStorage, IndexedDB, service workers, caches etc. of every origin the scrape visited"""
+        session = await entry.context.new_cdp_session(entry.page)
+        try:
+            for origin in entry.origins:
+                await session.send('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': _CLEARED_STORAGE})
+        finally:
+            await session.detach()
+        entry.origins.clear()
+
+    async def _reset(self, entry: PooledContext) -> bool:
+        """Return the context to a clean state; False if it should be discarded"""
+        if entry.uses >= self.max_uses or entry.page.is_closed():
+            return False
+        try:
+            # A new tab, since sessionStorage belongs to the tab rather than the context
+            for page in entry.context.pages:
+                await page.close()
+            entry.page = await entry.context.new_page()
+            await entry.context.clear_cookies()
+            await entry.context.clear_permissions()
+            if entry.origins:
+                # Needs Chromium's CDP; elsewhere the failure below recycles the context instead
+                await self._clear_storage(entry)
+            return True
+        except Exception as e:
+            print(f"Error resetting browser context: {e}")
+            return False
+
+    async def warm(self, count: int = BROWSER_POOL_WARM) -> None:
+        """Pre-create idle contexts so the first scrapes skip setup"""
+        for _ in range(min(count, self.size) - len(self._idle)):
+            self._idle.append(await self._create())
+
+    @asynccontextmanager
+    async def lease(self):
+        """Borrow a context/page pair for one scrape"""
+        if self._closed:
+            raise RuntimeError("Browser context pool is closed")
+
+        self._waiting += 1
+        try:
+            with stage('browser.acquire'):
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise BrowserPoolTimeout(
+                f"No browser context available after {self.acquire_timeout:.0f}s"
+            )
+        finally:
+            self._waiting -= 1
+
+        self._in_use += 1
+        entry: Optional[PooledContext] = None
+        healthy = False
+        try:
+            entry = self._idle.popleft() if self._idle else await self._create()
+            entry.uses += 1
+            if entry.blocker:
+                entry.blocker.stats.reset()
+            yield entry
+            healthy = True
+        finally:
+            try:
+                if entry is not None:
+                    try:
+                        if healthy and not self._closed and await self._reset(entry):
+                            self._idle.append(entry)
+                        else:
+                            await self._discard(entry)
+                    except BaseException:
+                        # Cancelled mid-reset or mid-close: the context is in an unknown state,
+                        # so make sure it gets closed even if we are cancelled again
+                        await asyncio.shield(self._discard(entry))
+                        raise
+            finally:
+                self._in_use -= 1
+                self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': self.size,
+            'inUse': self._in_use,
+            'idle': len(self._idle),
+            'waiting': self._waiting,
+        }
+
+    async def close(self) -> None:
+        self._closed = True
+        while self._idle:
+            await self._discard(self._idle.popleft())
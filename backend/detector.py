@@ -0,0 +1,439 @@
+"""Tiered, single-pass authentication form detector.
+
+Pages go through up to three tiers:
+
+1. `prefilter` - a regex scan over the raw HTML; pages without anything that
+   could be a password input are rejected without parsing.
+2. `lxml` - the page is parsed straight into an lxml tree and inspected
+   without building BeautifulSoup wrapper objects.
+3. `bs4` - BeautifulSoup, only when lxml refuses the input (for example a
+   str carrying an XML encoding declaration).
+
+The document is traversed once. Every element gets a small summary frame
+(does its subtree hold a username-like input, how many inputs, nearest
+enclosing <form>), and summaries are folded into the parent when an element
+closes. The auth container is then chosen from the password inputs'
+ancestor frames, and only that container's subtree is scanned again to pick
+the username, password and submit controls.
+
+Selection rules (and their priority order) mirror the original per-ancestor
+find() heuristics, so results are identical for the same parse tree.
+"""
+import re
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin
+
+import lxml.html
+from bs4 import BeautifulSoup, Tag
+from lxml import etree
+
+from models import AuthComponent
+
+# How far above a password input to look for a container (the <body> stops it earlier)
+MAX_CONTAINER_DEPTH = 10
+# Fallback: levels above the first password input to look for a multi-input container
+MAX_FALLBACK_DEPTH = 5
+
+# Keyword tables, shared with the in-browser port in dom_extraction.py
+WALK_NAME_KEYWORDS = ('user', 'login', 'email', 'account', 'phone')
+WALK_HINT_KEYWORDS = ('email', 'phone', 'user', 'account')
+CONTAINER_KEYWORDS = ('login', 'signin', 'sign-in', 'auth', 'authentication', 'form')
+SUBMIT_KEYWORDS = ('submit', 'login', 'sign')
+SUBMIT_TEXT_KEYWORDS = ('sign in', 'login', 'log in', 'submit', 'continue', 'next')
+
+Attr = Callable[[str], Optional[str]]
+
+# ids usable in a selector without escaping
+_CSS_IDENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_-]*$')
+
+
+def _contains(keywords: Sequence[str]) -> Callable[[Optional[str]], bool]:
+    keywords = tuple(keywords)
+
+    def match(value: Optional[str]) -> bool:
+        if not value:
+            return False
+        value = value.lower()
+        return any(keyword in value for keyword in keywords)
+    return match
+
+
+def _has_class(value: Optional[str]) -> bool:
+    # The original submit matcher tested class tokens with
+    # `k in ' '.join(x).lower() if isinstance(x, list) else str(x).lower()`,
+    # which BeautifulSoup calls per token, so any non-blank class matched.
+    # Kept as is so results stay identical to the original detector.
+    return bool(value) and not value.isspace()
+
+
+def _equals(expected: str) -> Callable[[Optional[str]], bool]:
+    return lambda value: value == expected
+
+
+def _compile(patterns: Sequence[Tuple[Tuple[str, Callable[[Optional[str]], bool]], ...]]):
+    """Turn (attribute, test) conjunctions into predicates over an attribute getter"""
+    compiled = []
+    for conditions in patterns:
+        def predicate(attr: Attr, conditions=conditions) -> bool:
+            return all(test(attr(name)) for name, test in conditions)
+        compiled.append(predicate)
+    return tuple(compiled)
+
+
+# Inputs that make an ancestor look like a login container while walking up
+_WALK_USERNAME_PATTERNS = _compile([
+    (('type', _equals('text')),),
+    (('type', _equals('email')),),
+    (('name', _contains(WALK_NAME_KEYWORDS)),),
+    (('id', _contains(WALK_NAME_KEYWORDS)),),
+    (('placeholder', _contains(WALK_HINT_KEYWORDS)),),
+    (('aria-label', _contains(WALK_HINT_KEYWORDS)),),
+])
+
+# Username input candidates inside the chosen container, highest priority first
+_USERNAME_PATTERNS = _compile([
+    (('type', _equals('text')),),
+    (('type', _equals('email')),),
+    (('type', _equals('tel')),),
+    (('name', _contains(WALK_NAME_KEYWORDS + ('mobile',))),),
+    (('id', _contains(WALK_NAME_KEYWORDS + ('mobile',))),),
+    (('placeholder', _contains(WALK_HINT_KEYWORDS + ('username',))),),
+    (('aria-label', _contains(WALK_HINT_KEYWORDS)),),
+    (('autocomplete', _contains(('username', 'email', 'tel'))),),
+])
+
+# Submit control candidates (<input> preferred over <button> per pattern)
+_SUBMIT_PATTERNS = _compile([
+    (('type', _equals('submit')),),
+    (('type', _equals('button')), ('class', _has_class)),
+    (('type', _equals('button')), ('id', _contains(SUBMIT_KEYWORDS))),
+    (('type', _equals('button')), ('name', _contains(SUBMIT_KEYWORDS))),
+])
+
+_is_container_hint = _contains(CONTAINER_KEYWORDS)
+
+# Superset of every markup a parser could turn into <input type="password">.
+# Parsers lowercase attribute names but keep values as written, and the
+# detector compares the value exactly, so only the name is case-insensitive.
+_TYPE_BEFORE_VALUE = re.compile(r'(?i:type)\s*=\s*["\']?\s*$')
+_TYPE_LOOKBEHIND = 64
+
+
+def _first_match(patterns, attr: Attr, limit: int) -> int:
+    """Index of the first pattern below `limit` that matches, or `limit`"""
+    for index in range(limit):
+        if patterns[index](attr):
+            return index
+    return limit
+
+
+class Bs4Tree:
+    """Adapter exposing the operations the detector needs on a BeautifulSoup tree"""
+
+    tier = 'bs4'
+
+    def __init__(self, html: str):
+        self.root = BeautifulSoup(html, 'lxml')
+
+    @staticmethod
+    def name(node: Tag) -> str:
+        return node.name
+
+    @staticmethod
+    def children(node: Tag) -> Iterable[Tag]:
+        return [child for child in node.contents if isinstance(child, Tag)]
+
+    @staticmethod
+    def attr_getter(node: Tag) -> Attr:
+        attrs = node.attrs
+
+        def attr(name: str) -> Optional[str]:
+            value = attrs.get(name)
+            if isinstance(value, list):
+                return ' '.join(value)
+            return value
+        return attr
+
+    @staticmethod
+    def controls(container: Tag) -> Iterable[Tag]:
+        return container.find_all(['input', 'button'])
+
+    @staticmethod
+    def parent(node: Tag) -> Optional[Tag]:
+        parent = node.parent
+        return None if parent is None or isinstance(parent, BeautifulSoup) else parent
+
+    @staticmethod
+    def text(node: Tag) -> str:
+        return node.get_text()
+
+    @staticmethod
+    def serialize(node: Tag) -> str:
+        return str(node).strip()
+
+
+class LxmlTree:
+    """Adapter over a native lxml.html tree (no BeautifulSoup objects)"""
+
+    tier = 'lxml'
+
+    def __init__(self, html: str):
+        self.root = lxml.html.document_fromstring(html)
+
+    @staticmethod
+    def name(node) -> str:
+        return node.tag
+
+    @staticmethod
+    def children(node) -> Iterable[Any]:
+        # Comments and processing instructions have a non-string tag
+        return [child for child in node if isinstance(child.tag, str)]
+
+    @staticmethod
+    def attr_getter(node) -> Attr:
+        return node.get
+
+    @staticmethod
+    def controls(container) -> Iterable[Any]:
+        return container.iterdescendants('input', 'button')
+
+    @staticmethod
+    def parent(node) -> Optional[Any]:
+        return node.getparent()
+
+    @staticmethod
+    def text(node) -> str:
+        return node.text_content()
+
+    @staticmethod
+    def serialize(node) -> str:
+        return lxml.html.tostring(node, encoding='unicode', with_tail=False).strip()
+
+
+def might_have_password_input(html: str) -> bool:
+    """Cheap scan used to skip parsing pages that cannot contain a login form"""
+    # Find each literal "password" with a fast substring search and only run
+    # the regex over the few characters in front of it
+    index = html.find('password')
+    while index != -1:
+        if _TYPE_BEFORE_VALUE.search(html, max(0, index - _TYPE_LOOKBEHIND), index):
+            return True
+        index = html.find('password', index + 8)
+    return False
+
+
+class _Frame:
+    """Summary of one element, completed when the element closes"""
+    __slots__ = ('node', 'name', 'parent', 'form', 'username', 'inputs')
+
+    def __init__(self, node: Any, name: str, parent: Optional['_Frame']):
+        self.node = node
+        self.name = name
+        self.parent = parent
+        if parent is None:
+            self.form = None
+        else:
+            self.form = parent if parent.name == 'form' else parent.form
+        self.username = False
+        self.inputs = 0
+
+
+def _summarize(tree) -> List[_Frame]:
+    """Walk the document once; return frames for the password inputs in order"""
+    name_of = tree.name
+    children_of = tree.children
+    attr_getter = tree.attr_getter
+    walk_patterns = _WALK_USERNAME_PATTERNS
+    walk_count = len(walk_patterns)
+
+    passwords: List[_Frame] = []
+    root = _Frame(tree.root, name_of(tree.root), None)
+    stack = [(root, iter(children_of(tree.root)))]
+    while stack:
+        frame, pending = stack[-1]
+        node = next(pending, None)
+        if node is None:
+            stack.pop()
+            parent = frame.parent
+            if parent is not None:
+                if frame.username:
+                    parent.username = True
+                parent.inputs += frame.inputs
+            continue
+
+        name = name_of(node)
+        child = _Frame(node, name, frame)
+        if name == 'input':
+            attr = attr_getter(node)
+            frame.inputs += 1
+            if not frame.username and _first_match(walk_patterns, attr, walk_count) < walk_count:
+                frame.username = True
+            if attr('type') == 'password':
+                passwords.append(child)
+        stack.append((child, iter(children_of(node))))
+    return passwords
+
+
+def _has_container_hint(tree, frame: _Frame) -> bool:
+    attr = tree.attr_getter(frame.node)
+    return _is_container_hint(attr('class')) or _is_container_hint(attr('id'))
+
+
+def _choose_container(tree, passwords: List[_Frame]) -> Tuple[Any, Any]:
+    """Return (container node, form-like node or None)"""
+    container = None
+    for password in passwords:
+        if password.form is not None:
+            return password.form.node, password.form.node
+
+        # No <form>: walk up for a container with a username input or an auth-ish class/id.
+        # A later password input may override an earlier div-based match.
+        frame = password.parent
+        depth = 0
+        while frame is not None and frame.name and frame.name != 'body' and depth < MAX_CONTAINER_DEPTH:
+            depth += 1
+            if frame.username or _has_container_hint(tree, frame):
+                container = frame
+                break
+            frame = frame.parent
+    if container is not None:
+        return container.node, container.node
+
+    first = passwords[0]
+    frame = first.parent
+    for _ in range(MAX_FALLBACK_DEPTH):
+        if frame is None:
+            break
+        if frame.name and frame.inputs >= 2:
+            return frame.node, frame.node
+        frame = frame.parent
+
+    # Last resort: the password input's grandparent (or parent)
+    if first.parent is None:
+        return first.node, None
+    if first.parent.parent is None:
+        return first.parent.node, None
+    return first.parent.parent.node, None
+
+
+def _pick_controls(tree, container) -> Tuple[Any, Any, Any]:
+    """Scan the container's subtree once for username, password and submit controls"""
+    attr_getter = tree.attr_getter
+    username, username_rank = None, len(_USERNAME_PATTERNS)
+    password = None
+    submit_count = len(_SUBMIT_PATTERNS)
+    submit_inputs: List[Any] = [None] * submit_count
+    submit_buttons: List[Any] = [None] * submit_count
+    buttons: List[Any] = []
+
+    for node in tree.controls(container):
+        attr = attr_getter(node)
+        if tree.name(node) == 'input':
+            if username_rank:
+                rank = _first_match(_USERNAME_PATTERNS, attr, username_rank)
+                if rank < username_rank:
+                    username, username_rank = node, rank
+            if password is None and attr('type') == 'password':
+                password = node
+            found = submit_inputs
+        else:
+            buttons.append(node)
+            found = submit_buttons
+        for index in range(submit_count):
+            if found[index] is None and _SUBMIT_PATTERNS[index](attr):
+                found[index] = node
+
+    submit = None
+    for index in range(submit_count):
+        submit = submit_inputs[index] if submit_inputs[index] is not None else submit_buttons[index]
+        if submit is not None:
+            break
+    if submit is None:
+        for button in buttons:
+            text = (tree.text(button) or '').lower()
+            if any(keyword in text for keyword in SUBMIT_TEXT_KEYWORDS):
+                submit = button
+                break
+    return username, password, submit
+
+
+def css_path(tree, node) -> str:
+    """CSS selector for a node: child steps up to the nearest ancestor with a plain id, or the root"""
+    steps = []
+    while node is not None:
+        name = tree.name(node)
+        node_id = tree.attr_getter(node)('id')
+        if node_id and _CSS_IDENT.match(node_id):
+            steps.append(f"{name}#{node_id}")
+            break
+        parent = tree.parent(node)
+        if parent is None:
+            steps.append(name)
+            break
+        same = [child for child in tree.children(parent) if tree.name(child) == name]
+        if len(same) > 1:
+            position = next(index for index, child in enumerate(same) if child is node) + 1
+            steps.append(f"{name}:nth-of-type({position})")
+        else:
+            steps.append(name)
+        node = parent
+    return ' > '.join(reversed(steps))
+
+
+def detect_in_tree(tree, base_url: str) -> AuthComponent:
+    """Detect the auth form in an already-parsed document"""
+    passwords = _summarize(tree)
+    if not passwords:
+        return AuthComponent(found=False, parserTier=tree.tier)
+
+    container, form_element = _choose_container(tree, passwords)
+    username, password, submit = _pick_controls(tree, container)
+
+    method = 'GET'
+    action = base_url
+    if form_element is not None:
+        attr = tree.attr_getter(form_element)
+        method = (attr('method') if attr('method') is not None else 'GET').upper()
+        action_attr = attr('action')
+        if action_attr:
+            try:
+                action = urljoin(base_url, action_attr)
+            except Exception:
+                action = base_url
+
+    chosen = {
+        'container': container,
+        'form': form_element,
+        'username': username,
+        'password': password,
+        'submit': submit,
+    }
+    serialize = tree.serialize
+    return AuthComponent(
+        found=True,
+        htmlSnippet=serialize(container),
+        formElement=serialize(form_element) if form_element is not None else '',
+        usernameInput=serialize(username) if username is not None else '',
+        passwordInput=serialize(password) if password is not None else '',
+        submitButton=serialize(submit) if submit is not None else '',
+        method=method,
+        action=action,
+        selectors={role: css_path(tree, node) for role, node in chosen.items() if node is not None},
+        parserTier=tree.tier,
+    )
+
+
+def parse(html: str):
+    """Parse with lxml, falling back to BeautifulSoup if lxml rejects the input"""
+    try:
+        return LxmlTree(html)
+    except (etree.ParserError, ValueError) as e:
+        print(f"lxml could not parse page ({e}), falling back to BeautifulSoup")
+        return Bs4Tree(html)
+
+
+def detect(html: str, base_url: str) -> AuthComponent:
+    """Detect the page's authentication form using the cheapest tier that can decide"""
+    if not might_have_password_input(html):
+        return AuthComponent(found=False, parserTier='prefilter')
+    return detect_in_tree(parse(html), base_url)
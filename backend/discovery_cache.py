@@ -0,0 +1,126 @@
+"""Persistent per-domain cache of discovered login page URLs.
+
+Backed by SQLite in WAL mode so every uvicorn worker process (and the render
+workers) share the same answers. Calls run in a thread to keep disk I/O off
+the event loop.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config import env_float, env_str
+
+DISCOVERY_DB_PATH = env_str(
+    'DISCOVERY_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'discovery.sqlite3'),
+)
+# Seconds a discovered login URL is trusted before rediscovering it
+DISCOVERY_TTL = env_float('DISCOVERY_TTL', 7 * 24 * 3600.0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS login_urls (
+    domain TEXT PRIMARY KEY,
+    login_url TEXT NOT NULL,
+    method TEXT NOT NULL,
+    discovered_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+@dataclass
+class Discovery:
+    domain: str
+    login_url: str
+    method: str  # how it was found: 'link', 'common-path', 'static-probe'
+    discovered_at: float
+
+
+class DiscoveryCache:
+    def __init__(self, path: str = DISCOVERY_DB_PATH, ttl: float = DISCOVERY_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._initialized = False
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _lookup(self, domain: str) -> Optional[Discovery]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT login_url, method, discovered_at FROM login_urls WHERE domain = ? AND expires_at > ?',
+                (domain, time.time()),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE login_urls SET hits = hits + 1 WHERE domain = ?', (domain,))
+            conn.commit()
+            return Discovery(domain, row[0], row[1], row[2])
+        finally:
+            conn.close()
+
+    def _store(self, domain: str, login_url: str, method: str) -> None:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO login_urls (domain, login_url, method, discovered_at, expires_at, hits) '
+                'VALUES (?, ?, ?, ?, ?, 0)',
+                (domain, login_url, method, now, now + self.ttl),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _invalidate(self, domain: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM login_urls WHERE domain = ?', (domain,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    async def lookup(self, domain: str) -> Optional[Discovery]:
+        """Return the cached login URL for a domain, if it has not expired"""
+        try:
+            found = await asyncio.to_thread(self._lookup, domain)
+        except sqlite3.Error as e:
+            print(f"Discovery cache lookup failed for {domain}: {e}")
+            return None
+        self.counters['hits' if found else 'misses'] += 1
+        return found
+
+    async def store(self, domain: str, login_url: str, method: str) -> None:
+        """Remember where a domain's login page is and how it was found"""
+        try:
+            await asyncio.to_thread(self._store, domain, login_url, method)
+            self.counters['stores'] += 1
+        except sqlite3.Error as e:
+            print(f"Discovery cache store failed for {domain}: {e}")
+
+    async def invalidate(self, domain: str) -> None:
+        """Forget a domain's login URL, e.g. after detection failed on it"""
+        try:
+            await asyncio.to_thread(self._invalidate, domain)
+            self.counters['invalidations'] += 1
+        except sqlite3.Error as e:
+            print(f"Discovery cache invalidation failed for {domain}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters)
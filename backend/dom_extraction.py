@@ -0,0 +1,259 @@
+"""Auth form detection inside the rendered page.
+
+With BROWSER_EXTRACTION=dom, the detector's heuristics run as a script in
+the browser. Only the chosen container and control snippets come back over
+CDP, instead of serializing the whole DOM with page.content() and parsing
+it again in Python. The script mirrors detector.py and reads its keyword
+tables, so both paths choose the same elements; snippets are the browser's
+outerHTML serialization.
+"""
+from typing import Optional
+
+from playwright.async_api import Page
+
+from config import env_str
+from detector import (
+    CONTAINER_KEYWORDS,
+    MAX_CONTAINER_DEPTH,
+    MAX_FALLBACK_DEPTH,
+    SUBMIT_KEYWORDS,
+    SUBMIT_TEXT_KEYWORDS,
+    WALK_HINT_KEYWORDS,
+    WALK_NAME_KEYWORDS,
+)
+from models import AuthComponent
+from timings import stage
+
+# 'html' (default): page.content() + detector; 'dom': detect inside the page
+BROWSER_EXTRACTION = (env_str('BROWSER_EXTRACTION', 'html') or 'html').lower()
+
+_KEYWORDS = {
+    'walkName': list(WALK_NAME_KEYWORDS),
+    'walkHint': list(WALK_HINT_KEYWORDS),
+    'container': list(CONTAINER_KEYWORDS),
+    'submit': list(SUBMIT_KEYWORDS),
+    'submitText': list(SUBMIT_TEXT_KEYWORDS),
+    'maxContainerDepth': MAX_CONTAINER_DEPTH,
+    'maxFallbackDepth': MAX_FALLBACK_DEPTH,
+}
+
+# Returns null when the page has not rendered anything to inspect (the caller then
+# falls back to page.content())
+_EXTRACT_SCRIPT = """
+([baseUrl, kw]) => {
+    if (!document.body || document.body.children.length === 0) return null;
+
+    const contains = (keywords) => (value) => {
+        if (!value) return false;
+        value = value.toLowerCase();
+        return keywords.some((keyword) => value.includes(keyword));
+    };
+    const equals = (expected) => (value) => value === expected;
+    // Any non-blank class, as in detector._has_class
+    const hasClass = (value) => !!value && /\\S/.test(value);
+    const compile = (patterns) => patterns.map((conditions) =>
+        (el) => conditions.every(([name, test]) => test(el.getAttribute(name))));
+    const firstMatch = (patterns, el, limit) => {
+        for (let index = 0; index < limit; index++) {
+            if (patterns[index](el)) return index;
+        }
+        return limit;
+    };
+
+    const walkPatterns = compile([
+        [['type', equals('text')]],
+        [['type', equals('email')]],
+        [['name', contains(kw.walkName)]],
+        [['id', contains(kw.walkName)]],
+        [['placeholder', contains(kw.walkHint)]],
+        [['aria-label', contains(kw.walkHint)]],
+    ]);
+    const usernamePatterns = compile([
+        [['type', equals('text')]],
+        [['type', equals('email')]],
+        [['type', equals('tel')]],
+        [['name', contains(kw.walkName.concat(['mobile']))]],
+        [['id', contains(kw.walkName.concat(['mobile']))]],
+        [['placeholder', contains(kw.walkHint.concat(['username']))]],
+        [['aria-label', contains(kw.walkHint)]],
+        [['autocomplete', contains(['username', 'email', 'tel'])]],
+    ]);
+    const submitPatterns = compile([
+        [['type', equals('submit')]],
+        [['type', equals('button')], ['class', hasClass]],
+        [['type', equals('button')], ['id', contains(kw.submit)]],
+        [['type', equals('button')], ['name', contains(kw.submit)]],
+    ]);
+    const isContainerHint = contains(kw.container);
+
+    const passwords = Array.from(document.getElementsByTagName('input'))
+        .filter((el) => el.getAttribute('type') === 'password');
+    if (passwords.length === 0) return {found: false};
+
+    // Subtree summaries, computed only for the ancestors the walk visits
+    const summaries = new Map();
+    const summary = (el) => {
+        let result = summaries.get(el);
+        if (result === undefined) {
+            const inputs = el.getElementsByTagName('input');
+            let username = false;
+            for (const input of inputs) {
+                if (firstMatch(walkPatterns, input, walkPatterns.length) < walkPatterns.length) {
+                    username = true;
+                    break;
+                }
+            }
+            result = {username, inputs: inputs.length};
+            summaries.set(el, result);
+        }
+        return result;
+    };
+    const enclosingForm = (el) => (el.parentElement ? el.parentElement.closest('form') : null);
+
+    const chooseContainer = () => {
+        let container = null;
+        for (const password of passwords) {
+            const form = enclosingForm(password);
+            if (form) return [form, form];
+
+            // No <form>: walk up for a container with a username input or an auth-ish class/id.
+            // A later password input may override an earlier div-based match.
+            let el = password.parentElement;
+            let depth = 0;
+            while (el && el.localName !== 'body' && depth < kw.maxContainerDepth) {
+                depth++;
+                if (summary(el).username || isContainerHint(el.getAttribute('class')) || isContainerHint(el.getAttribute('id'))) {
+                    container = el;
+                    break;
+                }
+                el = el.parentElement;
+            }
+        }
+        if (container) return [container, container];
+
+        const first = passwords[0];
+        let el = first.parentElement;
+        for (let level = 0; level < kw.maxFallbackDepth && el; level++) {
+            if (summary(el).inputs >= 2) return [el, el];
+            el = el.parentElement;
+        }
+        if (!first.parentElement) return [first, null];
+        if (!first.parentElement.parentElement) return [first.parentElement, null];
+        return [first.parentElement.parentElement, null];
+    };
+
+    const pickControls = (container) => {
+        let username = null;
+        let usernameRank = usernamePatterns.length;
+        let password = null;
+        const submitInputs = submitPatterns.map(() => null);
+        const submitButtons = submitPatterns.map(() => null);
+        const buttons = [];
+        for (const el of container.querySelectorAll('input, button')) {
+            let found;
+            if (el.localName === 'input') {
+                if (usernameRank) {
+                    const rank = firstMatch(usernamePatterns, el, usernameRank);
+                    if (rank < usernameRank) {
+                        username = el;
+                        usernameRank = rank;
+                    }
+                }
+                if (password === null && el.getAttribute('type') === 'password') password = el;
+                found = submitInputs;
+            } else {
+                buttons.push(el);
+                found = submitButtons;
+            }
+            submitPatterns.forEach((pattern, index) => {
+                if (found[index] === null && pattern(el)) found[index] = el;
+            });
+        }
+
+        let submit = null;
+        for (let index = 0; index < submitPatterns.length && submit === null; index++) {
+            submit = submitInputs[index] !== null ? submitInputs[index] : submitButtons[index];
+        }
+        if (submit === null) {
+            submit = buttons.find((button) => {
+                const text = (button.textContent || '').toLowerCase();
+                return kw.submitText.some((keyword) => text.includes(keyword));
+            }) || null;
+        }
+        return [username, password, submit];
+    };
+
+    const [container, formElement] = chooseContainer();
+    const [username, password, submit] = pickControls(container);
+
+    let method = 'GET';
+    let action = baseUrl;
+    if (formElement) {
+        const methodAttr = formElement.getAttribute('method');
+        method = (methodAttr !== null ? methodAttr : 'GET').toUpperCase();
+        const actionAttr = formElement.getAttribute('action');
+        if (actionAttr) {
+            try {
+                action = new URL(actionAttr, baseUrl).href;
+            } catch (e) {
+                action = baseUrl;
+            }
+        }
+    }
+
+    const serialize = (el) => (el ? el.outerHTML.trim() : '');
+    const cssIdent = /^[A-Za-z_][A-Za-z0-9_-]*$/;
+    const cssPath = (el) => {
+        const steps = [];
+        while (el) {
+            const name = el.tagName.toLowerCase();
+            const id = el.getAttribute('id');
+            if (id && cssIdent.test(id)) {
+                steps.push(`${name}#${id}`);
+                break;
+            }
+            const parent = el.parentElement;
+            if (!parent) {
+                steps.push(name);
+                break;
+            }
+            const same = Array.from(parent.children).filter((child) => child.tagName === el.tagName);
+            steps.push(same.length > 1 ? `${name}:nth-of-type(${same.indexOf(el) + 1})` : name);
+            el = parent;
+        }
+        return steps.reverse().join(' > ');
+    };
+    const selectors = {};
+    const chosen = {container, form: formElement, username, password, submit};
+    for (const role of Object.keys(chosen)) {
+        if (chosen[role]) {
+            selectors[role] = cssPath(chosen[role]);
+        }
+    }
+    return {
+        found: true,
+        htmlSnippet: serialize(container),
+        formElement: serialize(formElement),
+        usernameInput: serialize(username),
+        passwordInput: serialize(password),
+        submitButton: serialize(submit),
+        method,
+        action,
+        selectors,
+    };
+}
+"""
+
+
+async def extract_auth_component(page: Page, base_url: str) -> Optional[AuthComponent]:
+    """Detect the auth form in the live DOM; None if that was not possible"""
+    with stage('extract'):
+        try:
+            extracted = await page.evaluate(_EXTRACT_SCRIPT, [base_url, _KEYWORDS])
+        except Exception as e:
+            # e.g. the page navigated mid-evaluation; the caller falls back to page.content()
+            print(f"In-page extraction failed for {base_url}: {e}")
+            return None
+    if extracted is None:
+        return None
+    return AuthComponent(**extracted, parserTier='dom')
@@ -0,0 +1,337 @@
+"""Shared, app-lifetime HTTP client used by the static fetch path"""
+import asyncio
+import ipaddress
+import socket
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpcore
+import httpx
+from httpx._utils import get_environment_proxies
+
+from config import env_bool, env_float, env_int
+from timings import record, stage
+
+# Pool sizing and keep-alive tuning
+HTTP_MAX_CONNECTIONS = env_int('HTTP_MAX_CONNECTIONS', 200)
+HTTP_MAX_CONNECTIONS_PER_HOST = env_int('HTTP_MAX_CONNECTIONS_PER_HOST', 8)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = env_int('HTTP_MAX_KEEPALIVE_CONNECTIONS', 50)
+HTTP_KEEPALIVE_EXPIRY = env_float('HTTP_KEEPALIVE_EXPIRY', 30.0)
+HTTP_TIMEOUT = env_float('HTTP_TIMEOUT', 15.0)
+HTTP_CONNECT_TIMEOUT = env_float('HTTP_CONNECT_TIMEOUT', 5.0)
+# HTTP/2 needs the optional `h2` package (pip install h2)
+HTTP_HTTP2 = env_bool('HTTP_HTTP2', False)
+# Seconds to keep resolved addresses; 0 disables the in-process DNS cache
+HTTP_DNS_CACHE_TTL = env_float('HTTP_DNS_CACHE_TTL', 300.0)
+
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that memoizes getaddrinfo results per host.
+
+    TLS still uses the original hostname for SNI and certificate checks,
+    because httpcore passes it to start_tls separately from connect_tcp.
+    """
+
+    def __init__(self, inner: httpcore.AsyncNetworkBackend, ttl: float):
+        self._inner = inner
+        self._ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        key = (host, port)
+        cached = self._cache.get(key)
+        now = time.monotonic()
+        if cached and cached[0] > now:
+            return cached[1]
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            # What httpcore raises when its own backend cannot resolve a host
+            raise httpcore.ConnectError(str(e)) from e
+        record('dns', (time.perf_counter() - started) * 1000)
+        addresses: List[str] = []
+        for info in infos:
+            address = info[4][0]
+            if address not in addresses:
+                addresses.append(address)
+        if addresses:
+            self._cache[key] = (now + self._ttl, addresses)
+        return addresses or [host]
+
+    def forget(self, host: str, port: int) -> None:
+        self._cache.pop((host, port), None)
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = await self._resolve(host, port)
+        last_error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._inner.connect_tcp(
+                    address,
+                    port,
+                    timeout=timeout,
+                    local_address=local_address,
+                    socket_options=socket_options,
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        # Every cached address failed; resolve afresh next time
+        self.forget(host, port)
+        raise last_error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
+
+
+_client: Optional[httpx.AsyncClient] = None
+# httpcore trace events timed as stages (connect includes DNS when it is not cached)
+_TRACED_STAGES = {
+    'connection.connect_tcp': 'connect',
+    'connection.start_tls': 'tls',
+    'http11.receive_response_headers': 'ttfb',
+    'http2.receive_response_headers': 'ttfb',
+    'http11.receive_response_body': 'download',
+    'http2.receive_response_body': 'download',
+}
+# host -> [semaphore, number of callers holding or waiting on it]
+_host_slots: Dict[str, list] = {}
+# httpcore errors and the httpx errors callers catch, most specific first
+_ERRORS = (
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+)
+
+
+def _httpx_error(error: Exception, request: httpx.Request) -> Exception:
+    for core_error, httpx_error in _ERRORS:
+        if isinstance(error, core_error):
+            return httpx_error(str(error), request=request)
+    return error
+
+
+async def _acquire_host(host: str) -> list:
+    """Take one of the host's HTTP_MAX_CONNECTIONS_PER_HOST slots"""
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = [asyncio.Semaphore(max(1, HTTP_MAX_CONNECTIONS_PER_HOST)), 0]
+        _host_slots[host] = slot
+    slot[1] += 1
+    try:
+        await slot[0].acquire()
+    except BaseException:
+        _forget_host(host, slot)
+        raise
+    return slot
+
+
+def _forget_host(host: str, slot: list) -> None:
+    slot[1] -= 1
+    if slot[1] == 0 and _host_slots.get(host) is slot:
+        del _host_slots[host]
+
+
+def _release_host(host: str, slot: list) -> None:
+    slot[0].release()
+    _forget_host(host, slot)
+
+
+class _HostSlotStream(httpx.AsyncByteStream):
+    """Response body that gives the host slot back once it is read or closed"""
+
+    def __init__(self, stream, request: httpx.Request, host: str, slot: list):
+        self._stream = stream
+        self._request = request
+        self._host = host
+        self._slot: Optional[list] = slot
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except Exception as e:
+            raise _httpx_error(e, self._request) from e
+
+    async def aclose(self) -> None:
+        try:
+            if hasattr(self._stream, 'aclose'):
+                await self._stream.aclose()
+        finally:
+            if self._slot is not None:
+                _release_host(self._host, self._slot)
+                self._slot = None
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """httpx transport over an httpcore connection pool built with our network backend.
+
+    Every request, redirect hops included, holds a slot of its own host
+    until its response body is closed, so no host gets more than
+    HTTP_MAX_CONNECTIONS_PER_HOST requests at once.
+    """
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool):
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host.lower()
+        slot = await _acquire_host(host)
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        try:
+            response = await self._pool.handle_async_request(core_request)
+        except BaseException as e:
+            _release_host(host, slot)
+            if isinstance(e, Exception):
+                raise _httpx_error(e, request) from e
+            raise
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_HostSlotStream(response.stream, request, host, slot),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._pool.aclose()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _proxy_mounts(http2: bool) -> Dict[str, Optional[httpx.AsyncBaseTransport]]:
+    """Transports for the proxies set in HTTP_PROXY/HTTPS_PROXY/ALL_PROXY/NO_PROXY.
+
+    httpx only reads these when it builds its own transport, so they are
+    mounted here the way httpx would. Proxied requests go through a plain
+    httpx transport (no DNS cache or per-host limit, the proxy resolves and
+    connects); NO_PROXY patterns map to None, which selects the pooled one.
+    """
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    transports: Dict[str, httpx.AsyncBaseTransport] = {}
+    mounts: Dict[str, Optional[httpx.AsyncBaseTransport]] = {}
+    for pattern, proxy_url in get_environment_proxies().items():
+        if proxy_url is None:
+            mounts[pattern] = None
+            continue
+        if proxy_url not in transports:
+            transports[proxy_url] = httpx.AsyncHTTPTransport(proxy=proxy_url, http2=http2, limits=limits)
+        mounts[pattern] = transports[proxy_url]
+        print(f"Static fetches matching {pattern} go through proxy {httpx.URL(proxy_url).copy_with(username=None, password=None)}")
+    return mounts
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = HTTP_HTTP2
+    if http2 and not _http2_available():
+        print("Warning: HTTP_HTTP2 is enabled but the 'h2' package is not installed, using HTTP/1.1")
+        http2 = False
+
+    network_backend = None
+    if HTTP_DNS_CACHE_TTL > 0:
+        network_backend = CachingDNSBackend(httpcore.AnyIOBackend(), HTTP_DNS_CACHE_TTL)
+    pool = httpcore.AsyncConnectionPool(
+        ssl_context=httpx.create_ssl_context(),
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        http1=True,
+        http2=http2,
+        network_backend=network_backend,
+    )
+
+    return httpx.AsyncClient(
+        transport=PooledTransport(pool),
+        mounts=_proxy_mounts(http2),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        follow_redirects=True,
+    )
+
+
+async def start_http_pool() -> None:
+    """Create the shared client (called from the app startup hook)"""
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+
+async def close_http_pool() -> None:
+    """Close the shared client and drop every pooled connection"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_slots.clear()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily outside the app lifecycle"""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def _tracer():
+    """httpcore trace hook recording connect/TLS/first-byte/download times of a request"""
+    started: Dict[str, float] = {}
+
+    async def trace(event: str, info: dict) -> None:
+        name, _, phase = event.rpartition('.')
+        stage_name = _TRACED_STAGES.get(name)
+        if stage_name is None:
+            return
+        if phase == 'started':
+            started[name] = time.perf_counter()
+        elif phase in ('complete', 'failed') and name in started:
+            record(stage_name, (time.perf_counter() - started.pop(name)) * 1000)
+    return trace
+
+
+async def fetch(url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """GET a URL through the shared pool (the transport applies the per-host limit)"""
+    client = get_http_client()
+    with stage('fetch'):
+        return await client.get(url, headers=headers, extensions={'trace': _tracer()})
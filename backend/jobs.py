@@ -0,0 +1,540 @@
+"""Durable scrape jobs for URL lists too large for one request.
+
+A job's URLs are written to SQLite on submission and worked off by a fixed
+set of worker coroutines. Each worker claims one item at a time with a
+lease, scrapes it, and checkpoints the result in the same transaction as
+the job's progress counters. Nothing about a job is held in memory, so
+memory does not grow with job size.
+
+A worker renews its lease while the scrape runs (including time spent
+waiting for admission), and every write it makes is conditioned on the
+lease token it got with the claim, so a worker that lost its item can never
+overwrite the result of the one that holds it now. Items whose lease runs
+out (the process died mid-scrape) go back to pending, so jobs resume after
+a restart. Failed scrapes are retried with exponential backoff; admission
+rejections are retried after their Retry-After without counting as an
+attempt.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from admission import ADMISSION_BATCH_TIMEOUT, AdmissionRejected, admitted_as
+from config import env_float, env_int, env_str
+from models import ScrapeResult
+from urls import normalize_url
+
+JOBS_DB_PATH = env_str(
+    'JOBS_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs.sqlite3'),
+)
+# Items scraped at once by this process
+JOBS_WORKERS = env_int('JOBS_WORKERS', 8)
+JOBS_MAX_URLS = env_int('JOBS_MAX_URLS', 200000)
+JOBS_MAX_ATTEMPTS = env_int('JOBS_MAX_ATTEMPTS', 3)
+# First retry delay in seconds, doubled per attempt
+JOBS_RETRY_BASE = env_float('JOBS_RETRY_BASE', 10.0)
+# Seconds a claimed item belongs to its worker without a renewal before it is handed out again
+JOBS_LEASE = env_float('JOBS_LEASE', 180.0)
+# Seconds an idle worker waits before looking for work submitted elsewhere or due for retry
+JOBS_POLL_INTERVAL = env_float('JOBS_POLL_INTERVAL', 1.0)
+# Rows per insert when a job is submitted
+_INSERT_CHUNK = 1000
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        cache_control TEXT,
+        total INTEGER NOT NULL DEFAULT 0,
+        succeeded INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        found INTEGER NOT NULL DEFAULT 0,
+        retries INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS job_items (
+        job_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        lease_until REAL,
+        lease_token TEXT,
+        error TEXT,
+        result TEXT,
+        finished_at REAL,
+        PRIMARY KEY (job_id, idx)
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS job_items_due ON job_items (status, next_attempt_at)',
+    'CREATE INDEX IF NOT EXISTS job_items_lease ON job_items (status, lease_until)',
+]
+
+ITEM_STATUSES = ('pending', 'running', 'done', 'failed', 'cancelled')
+
+
+class JobNotFound(Exception):
+    pass
+
+
+class JobTooLarge(Exception):
+    pass
+
+
+@dataclass
+class Claim:
+    job_id: str
+    index: int
+    url: str
+    attempts: int
+    cache_control: Optional[str]
+    token: str
+
+
+def read_url_lines(lines: Iterable[str]) -> Iterator[str]:
+    """URLs from an uploaded list: one per line, or the first column of a CSV; blank and # lines skipped"""
+    for line in lines:
+        value = line.strip().split(',', 1)[0].strip().strip('"')
+        if value and not value.startswith('#') and value.lower() != 'url':
+            yield value
+
+
+class JobQueue:
+    def __init__(
+        self,
+        scrape: Callable[[str, Optional[str]], Awaitable[ScrapeResult]],
+        path: str = JOBS_DB_PATH,
+        workers: int = JOBS_WORKERS,
+        max_attempts: int = JOBS_MAX_ATTEMPTS,
+        retry_base: float = JOBS_RETRY_BASE,
+        lease: float = JOBS_LEASE,
+    ):
+        self.scrape = scrape
+        self.path = path
+        self.workers = max(0, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.lease = lease
+        self._initialized = False
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._claimed: Dict[Tuple[str, int], Claim] = {}
+        self.counters = {'claimed': 0, 'done': 0, 'failed': 0, 'retried': 0, 'deferred': 0, 'requeued': 0}
+
+    # -- storage (runs in a thread) --
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10.0)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._initialized = True
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _create(self, urls: Iterable[str], cache_control: Optional[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO jobs (id, status, cache_control, created_at) VALUES (?, ?, ?, ?)',
+                (job_id, 'queued', cache_control, now),
+            )
+            total = 0
+            invalid = 0
+            chunk: List[tuple] = []
+            for url in urls:
+                if total >= JOBS_MAX_URLS:
+                    conn.rollback()
+                    raise JobTooLarge(f"A job holds at most {JOBS_MAX_URLS} URLs")
+                if normalize_url(url) is None:
+                    invalid += 1
+                    chunk.append((job_id, total, url, 'failed', now, 'Invalid URL format', now))
+                else:
+                    chunk.append((job_id, total, url, 'pending', now, None, None))
+                total += 1
+                if len(chunk) >= _INSERT_CHUNK:
+                    self._insert_items(conn, chunk)
+                    chunk = []
+            if chunk:
+                self._insert_items(conn, chunk)
+            if not total:
+                conn.rollback()
+                raise ValueError("A job needs at least one URL")
+            status = 'queued' if total > invalid else 'done'
+            conn.execute(
+                'UPDATE jobs SET total = ?, failed = ?, status = ?, finished_at = ? WHERE id = ?',
+                (total, invalid, status, now if status == 'done' else None, job_id),
+            )
+            conn.commit()
+            return job_id
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert_items(conn: sqlite3.Connection, rows: List[tuple]) -> None:
+        conn.executemany(
+            'INSERT INTO job_items (job_id, idx, url, status, next_attempt_at, error, finished_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            rows,
+        )
+
+    def _claim(self) -> Optional[Claim]:
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "UPDATE job_items SET status = 'running', attempts = attempts + 1, lease_until = ?, lease_token = ? "
+                "WHERE rowid = (SELECT rowid FROM job_items WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT 1) "
+                "RETURNING job_id, idx, url, attempts",
+                (now + self.lease, token, now),
+            ).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            job_id = row[0]
+            job = conn.execute('SELECT cache_control FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'", (now, job_id))
+            conn.commit()
+            return Claim(job_id, row[1], row[2], row[3], job[0] if job else None, token)
+        finally:
+            conn.close()
+
+    def _requeue_expired(self) -> int:
+        conn = self._connect()
+        try:
+            count = conn.execute(
+                "UPDATE job_items SET status = 'pending', lease_token = NULL WHERE status = 'running' AND lease_until < ?",
+                (time.time(),),
+            ).rowcount
+            conn.commit()
+            return count
+        finally:
+            conn.close()
+
+    def _renew(self, claim: Claim) -> bool:
+        """Extend the lease of an item still held by this claim; False if it was lost"""
+        conn = self._connect()
+        try:
+            updated = conn.execute(
+                "UPDATE job_items SET lease_until = ? "
+                "WHERE job_id = ? AND idx = ? AND status = 'running' AND lease_token = ?",
+                (time.time() + self.lease, claim.job_id, claim.index, claim.token),
+            ).rowcount
+            conn.commit()
+            return bool(updated)
+        finally:
+            conn.close()
+
+    def _release(self, claims: List[Claim]) -> None:
+        """Hand items this process was working on back to the queue (clean shutdown)"""
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "UPDATE job_items SET status = 'pending', attempts = attempts - 1, lease_until = NULL, lease_token = NULL "
+                "WHERE job_id = ? AND idx = ? AND status = 'running' AND lease_token = ?",
+                [(claim.job_id, claim.index, claim.token) for claim in claims],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _finish(self, claim: Claim, result: ScrapeResult) -> None:
+        now = time.time()
+        found = bool(result.success and result.authComponent and result.authComponent.found)
+        status = 'done' if result.success else 'failed'
+        conn = self._connect()
+        try:
+            updated = conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL, "
+                "lease_token = NULL WHERE job_id = ? AND idx = ? AND status = 'running' AND lease_token = ?",
+                (status, result.model_dump_json(exclude={'timings'}), result.error, now,
+                 claim.job_id, claim.index, claim.token),
+            ).rowcount
+            if updated:
+                conn.execute(
+                    'UPDATE jobs SET succeeded = succeeded + ?, failed = failed + ?, found = found + ? WHERE id = ?',
+                    (int(result.success), int(not result.success), int(found), claim.job_id),
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', finished_at = ? "
+                    "WHERE id = ? AND status = 'running' AND succeeded + failed >= total",
+                    (now, claim.job_id),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _retry(self, claim: Claim, delay: float, error: str, count_attempt: bool) -> None:
+        conn = self._connect()
+        try:
+            updated = conn.execute(
+                "UPDATE job_items SET status = 'pending', next_attempt_at = ?, error = ?, lease_until = NULL, "
+                "lease_token = NULL, attempts = attempts - ? "
+                "WHERE job_id = ? AND idx = ? AND status = 'running' AND lease_token = ?",
+                (time.time() + delay, error, 0 if count_attempt else 1, claim.job_id, claim.index, claim.token),
+            ).rowcount
+            if updated and count_attempt:
+                conn.execute('UPDATE jobs SET retries = retries + 1 WHERE id = ?', (claim.job_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _cancel(self, job_id: str) -> bool:
+        now = time.time()
+        conn = self._connect()
+        try:
+            updated = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (now, job_id),
+            ).rowcount
+            if updated:
+                conn.execute(
+                    "UPDATE job_items SET status = 'cancelled', finished_at = ? "
+                    "WHERE job_id = ? AND status IN ('pending', 'running')",
+                    (now, job_id),
+                )
+            conn.commit()
+            return bool(updated) or conn.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _job_dict(row: tuple, counts: Dict[str, int]) -> Dict[str, Any]:
+        (job_id, status, cache_control, total, succeeded, failed, found, retries,
+         created_at, started_at, finished_at) = row
+        finished = succeeded + failed
+        elapsed = (finished_at or time.time()) - started_at if started_at else 0.0
+        return {
+            'id': job_id,
+            'status': status,
+            'total': total,
+            'finished': finished,
+            'succeeded': succeeded,
+            'failed': failed,
+            'found': found,
+            'retries': retries,
+            'items': {name: counts.get(name, 0) for name in ITEM_STATUSES},
+            'progress': round(finished / total, 4) if total else 1.0,
+            'itemsPerSecond': round(finished / elapsed, 2) if elapsed > 0 else None,
+            'cacheControl': cache_control,
+            'createdAt': created_at,
+            'startedAt': started_at,
+            'finishedAt': finished_at,
+        }
+
+    def _status(self, job_id: str) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                raise JobNotFound(job_id)
+            counts = dict(conn.execute(
+                'SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status', (job_id,),
+            ).fetchall())
+            return self._job_dict(row, counts)
+        finally:
+            conn.close()
+
+    def _list(self, limit: int) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+            return [self._job_dict(row, {}) for row in rows]
+        finally:
+            conn.close()
+
+    def _page(self, job_id: str, after: int, limit: int, status: Optional[str]) -> List[tuple]:
+        conn = self._connect()
+        try:
+            if conn.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id,)).fetchone() is None:
+                raise JobNotFound(job_id)
+            query = 'SELECT idx, url, status, attempts, error, result FROM job_items WHERE job_id = ? AND idx > ?'
+            params: list = [job_id, after]
+            if status:
+                query += ' AND status = ?'
+                params.append(status)
+            else:
+                query += " AND status IN ('done', 'failed')"
+            query += ' ORDER BY idx LIMIT ?'
+            params.append(limit)
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+    # -- async API --
+
+    async def submit(self, urls: Iterable[str], cache_control: Optional[str] = None) -> str:
+        """Store a job's URLs and return its id; the workers pick it up right away.
+
+        Raises ValueError for an empty list and JobTooLarge past JOBS_MAX_URLS.
+        """
+        job_id = await asyncio.to_thread(self._create, urls, cache_control)
+        self._wake.set()
+        return job_id
+
+    async def status(self, job_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._status, job_id)
+
+    async def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._list, limit)
+
+    async def cancel(self, job_id: str) -> None:
+        if not await asyncio.to_thread(self._cancel, job_id):
+            raise JobNotFound(job_id)
+
+    async def page(self, job_id: str, after: int = -1, limit: int = 100,
+                   status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Finished items (or items in `status`) with index above `after`, in index order"""
+        rows = await asyncio.to_thread(self._page, job_id, after, limit, status)
+        return [
+            {
+                'index': index,
+                'url': url,
+                'status': item_status,
+                'attempts': attempts,
+                'error': error,
+                'result': ScrapeResult.model_validate_json(result) if result else None,
+            }
+            for index, url, item_status, attempts, error, result in rows
+        ]
+
+    async def iter_results(self, job_id: str, status: Optional[str] = None,
+                           page_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Every finished item in index order, read one page at a time"""
+        after = -1
+        while True:
+            items = await self.page(job_id, after, page_size, status)
+            for item in items:
+                yield item
+            if len(items) < page_size:
+                return
+            after = items[-1]['index']
+
+    # -- workers --
+
+    def _backoff(self, attempts: int) -> float:
+        delay = self.retry_base * (2 ** max(0, attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _work(self, claim: Claim) -> None:
+        try:
+            # Each job counts as one client for admission fair sharing
+            with admitted_as(f"job:{claim.job_id}", ADMISSION_BATCH_TIMEOUT):
+                result = await self.scrape(claim.url, claim.cache_control)
+        except AdmissionRejected as e:
+            self.counters['deferred'] += 1
+            metrics.job_items.inc(outcome='deferred')
+            await asyncio.to_thread(self._retry, claim, e.retry_after, str(e), False)
+            return
+        except Exception as e:
+            result = ScrapeResult(url=claim.url, success=False, error=str(e) or type(e).__name__)
+        if not result.success and claim.attempts < self.max_attempts:
+            self.counters['retried'] += 1
+            metrics.job_items.inc(outcome='retried')
+            await asyncio.to_thread(self._retry, claim, self._backoff(claim.attempts), result.error or '', True)
+            return
+        outcome = 'done' if result.success else 'failed'
+        self.counters[outcome] += 1
+        metrics.job_items.inc(outcome=outcome)
+        await asyncio.to_thread(self._finish, claim, result)
+
+    async def _heartbeat(self, claim: Claim) -> None:
+        """Keep the claim's lease alive for as long as its scrape runs"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                held = await asyncio.to_thread(self._renew, claim)
+            except sqlite3.Error as e:
+                print(f"Job queue lease renewal failed for {claim.url}: {e}")
+                continue
+            if not held:
+                # Cancelled, or handed out after a missed renewal; the result will not be saved
+                print(f"Job item {claim.job_id}/{claim.index} is no longer held by this worker")
+                return
+
+    async def _worker(self) -> None:
+        while True:
+            # Cleared before looking, so a submit that lands during the claim is not missed
+            self._wake.clear()
+            try:
+                claim = await asyncio.to_thread(self._claim)
+            except sqlite3.Error as e:
+                print(f"Job queue claim failed: {e}")
+                claim = None
+            if claim is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.counters['claimed'] += 1
+            key = (claim.job_id, claim.index)
+            self._claimed[key] = claim
+            heartbeat = asyncio.create_task(self._heartbeat(claim))
+            try:
+                await self._work(claim)
+            except sqlite3.Error as e:
+                # The lease runs out and the item is handed out again
+                print(f"Job queue checkpoint failed for {claim.url}: {e}")
+            finally:
+                heartbeat.cancel()
+            # Left in place on cancellation so close() hands the item back
+            self._claimed.pop(key, None)
+
+    async def _reaper(self) -> None:
+        while True:
+            try:
+                requeued = await asyncio.to_thread(self._requeue_expired)
+            except sqlite3.Error as e:
+                print(f"Job queue lease check failed: {e}")
+                requeued = 0
+            if requeued:
+                self.counters['requeued'] += requeued
+                print(f"Requeued {requeued} job items whose lease expired")
+                self._wake.set()
+            await asyncio.sleep(max(1.0, self.lease / 4))
+
+    def start(self) -> None:
+        """Start the workers (and resume any unfinished jobs)"""
+        if self._tasks or not self.workers:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._claimed:
+            try:
+                await asyncio.to_thread(self._release, list(self._claimed.values()))
+            except sqlite3.Error as e:
+                print(f"Could not release claimed job items: {e}")
+            self._claimed.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, 'workers': self.workers, 'active': len(self._claimed)}
@@ -0,0 +1,151 @@
+"""Ranks a page's login links in one in-page evaluation.
+
+Every anchor and button is scored by href keywords, text, visibility and
+position inside the browser, so finding the best candidate costs a single
+round trip instead of one query per selector. Per-site selectors live in a
+JSON rule table (login_link_rules.json) that can be extended without code
+changes.
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from playwright.async_api import Locator, Page
+
+from config import env_int, env_str
+from timings import stage
+from urls import domain_of
+
+LOGIN_LINK_RULES_PATH = env_str(
+    'LOGIN_LINK_RULES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'login_link_rules.json'),
+)
+# Ranked candidates returned per page; the rest are never clicked
+LOGIN_LINK_CANDIDATES = env_int('LOGIN_LINK_CANDIDATES', 5)
+
+# Marks the ranked elements so they can be clicked without searching again
+_CANDIDATE_ATTRIBUTE = 'data-login-candidate'
+
+_LOCATE_SCRIPT = """
+([ruleSelectors, maxResults, attribute]) => {
+    const HREF_KEYWORDS = ['login', 'signin', 'sign-in', 'sign_in', 'log-in'];
+    const LOGIN_TEXT = /\\b(sign|log)[\\s_-]?in\\b/i;
+    const NEGATIVE_TEXT = /\\b(sign|log)[\\s_-]?(up|out)\\b|register|create account/i;
+    const NEGATIVE_HREF = /(sign|log)[_-]?(up|out)|register/;
+
+    const ruleMatches = new Set();
+    for (const selector of ruleSelectors) {
+        try {
+            document.querySelectorAll(selector).forEach((el) => ruleMatches.add(el));
+        } catch (e) {
+            // Invalid selector in the rule table; skip it
+        }
+    }
+    const elements = new Set(document.querySelectorAll('a, button, [role="button"], [role="link"]'));
+    ruleMatches.forEach((el) => elements.add(el));
+
+    const foldY = window.innerHeight || 800;
+    const scored = [];
+    for (const el of elements) {
+        const rect = el.getBoundingClientRect();
+        if (rect.width <= 0 || rect.height <= 0) continue;
+        const style = getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none' || Number(style.opacity) === 0) continue;
+
+        const href = (el.getAttribute('href') || '').toLowerCase();
+        const text = (el.innerText || el.getAttribute('aria-label') || el.getAttribute('title') || '').trim().slice(0, 80);
+        let score = 0;
+        if (ruleMatches.has(el)) score += 100;
+        if (HREF_KEYWORDS.some((keyword) => href.includes(keyword))) score += 40;
+        else if (href.includes('auth')) score += 20;
+        if (LOGIN_TEXT.test(text)) score += 50;
+        if (score === 0) continue;
+        if (NEGATIVE_TEXT.test(text) || NEGATIVE_HREF.test(href)) score -= 60;
+        if (score <= 0) continue;
+
+        // Login links usually sit in the header, above the fold
+        if (rect.top + window.scrollY < foldY) score += 10;
+        if (el.closest('header, nav, [role="banner"], [role="navigation"]')) score += 10;
+        if (text.length > 40) score -= 10;
+        scored.push({el, score, text, href});
+    }
+
+    // Stable sort: equal scores keep document order
+    scored.sort((a, b) => b.score - a.score);
+    document.querySelectorAll(`[${attribute}]`).forEach((el) => el.removeAttribute(attribute));
+    return scored.slice(0, maxResults).map((candidate, rank) => {
+        candidate.el.setAttribute(attribute, String(rank));
+        return {rank, score: candidate.score, text: candidate.text, href: candidate.href, tag: candidate.el.tagName.toLowerCase()};
+    });
+}
+"""
+
+
+@dataclass
+class LoginLinkCandidate:
+    rank: int
+    score: int
+    text: str
+    href: str
+    tag: str
+
+    @property
+    def selector(self) -> str:
+        return f'[{_CANDIDATE_ATTRIBUTE}="{self.rank}"]'
+
+    def describe(self) -> str:
+        return f"<{self.tag}> {self.text or self.href!r} (score {self.score})"
+
+
+def load_rules(path: str = LOGIN_LINK_RULES_PATH) -> List[dict]:
+    """Read the per-site rule table; a missing or broken file means no rules"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            rules = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not load login link rules from {path}: {e}")
+        return []
+    if not isinstance(rules, list):
+        print(f"Warning: login link rules in {path} must be a list")
+        return []
+    return [rule for rule in rules if isinstance(rule, dict)]
+
+
+_rules = load_rules()
+
+
+def matching_rules(base_url: str, rules: List[dict] = None) -> List[dict]:
+    """Rules whose domain matches the URL's host or a parent of it"""
+    host = domain_of(base_url)
+    matched = []
+    for rule in _rules if rules is None else rules:
+        domains = [domain.lower() for domain in rule.get('domains', [])]
+        if any(host == domain or host.endswith(f".{domain}") for domain in domains):
+            matched.append(rule)
+    return matched
+
+
+def rule_selectors(base_url: str, rules: List[dict] = None) -> List[str]:
+    return [selector for rule in matching_rules(base_url, rules) for selector in rule.get('selectors', [])]
+
+
+def warmup_url(base_url: str, rules: List[dict] = None) -> Optional[str]:
+    """Page to visit before a site's login URL so it sees an established session"""
+    for rule in matching_rules(base_url, rules):
+        if rule.get('warmup'):
+            return rule['warmup']
+    return None
+
+
+async def locate_login_links(page: Page, base_url: str, limit: int = LOGIN_LINK_CANDIDATES) -> List[LoginLinkCandidate]:
+    """Rank the current page's visible login links, best first"""
+    with stage('locate'):
+        ranked = await page.evaluate(_LOCATE_SCRIPT, [rule_selectors(base_url), limit, _CANDIDATE_ATTRIBUTE])
+    return [LoginLinkCandidate(**candidate) for candidate in ranked]
+
+
+def candidate_locator(page: Page, candidate: LoginLinkCandidate) -> Locator:
+    return page.locator(candidate.selector).first
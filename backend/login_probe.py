@@ -0,0 +1,107 @@
+"""Parallel static probing of common login paths before falling back to a browser"""
+import asyncio
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from batch_scheduler import work_slot
+from config import env_float, env_list
+from http_pool import fetch
+from models import AuthComponent
+from parse_pool import detect_offloaded
+from timings import recording, stage
+
+LOGIN_PROBE_PATHS = env_list('LOGIN_PROBE_PATHS', [
+    '/login',
+    '/signin',
+    '/sign-in',
+    '/auth/login',
+    '/account/login',
+    '/users/sign_in',
+    '/user/login',
+])
+# Overall time allowed for the probe stage, in seconds
+LOGIN_PROBE_TIMEOUT = env_float('LOGIN_PROBE_TIMEOUT', 8.0)
+
+# Markers of pages whose content only exists after JavaScript runs
+_SPA_ROOT = re.compile(r'<div[^>]+id=["\']?(root|app|__next|__nuxt)["\']?[^>]*>\s*</div>', re.IGNORECASE)
+_JS_HINTS = ('please enable javascript', 'you need to enable javascript', '__next_data__', 'window.__initial_state__')
+
+
+@dataclass
+class ProbeOutcome:
+    login_url: Optional[str] = None
+    auth_component: Optional[AuthComponent] = None
+    # Candidates that answered but look JavaScript-rendered, in probe order
+    js_candidates: List[str] = field(default_factory=list)
+
+
+def looks_js_rendered(html: str) -> bool:
+    """Heuristic: the page is an app shell that a browser still has to render"""
+    lower = html[:200000].lower()
+    if any(hint in lower for hint in _JS_HINTS):
+        return True
+    if _SPA_ROOT.search(html):
+        return True
+    # Plenty of script but almost no markup to speak of
+    return lower.count('<script') >= 5 and lower.count('<input') == 0 and lower.count('<a ') < 5
+
+
+def candidate_urls(url: str, paths: List[str] = LOGIN_PROBE_PATHS) -> List[str]:
+    parts = urlsplit(url)
+    base = f"{parts.scheme}://{parts.netloc}"
+    return [f"{base}{path}" for path in paths]
+
+
+async def _probe(candidate: str, headers: dict):
+    # Concurrent probes would add up to more than the wall time; only the 'probe' stage is kept
+    with recording():
+        return await _fetch_and_detect(candidate, headers)
+
+
+async def _fetch_and_detect(candidate: str, headers: dict):
+    # Each probe is a static fetch like any other and takes its own admission slot;
+    # a rejected probe counts as a candidate without a login form
+    async with work_slot('static'):
+        response = await fetch(candidate, headers=headers)
+    final_url = str(response.url)
+    if response.status_code != 200:
+        return candidate, final_url, None, False
+    html = response.text
+    auth_component = await detect_offloaded(html, final_url)
+    return candidate, final_url, auth_component, not auth_component.found and looks_js_rendered(html)
+
+
+async def probe_login_paths(url: str, headers: dict, paths: List[str] = LOGIN_PROBE_PATHS) -> ProbeOutcome:
+    """Fetch every candidate login path at once; stop at the first with a login form"""
+    outcome = ProbeOutcome()
+    candidates = candidate_urls(url, paths)
+    if not candidates:
+        return outcome
+
+    js_rendered = set()
+    with stage('probe'):
+        tasks = [asyncio.create_task(_probe(candidate, headers)) for candidate in candidates]
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=LOGIN_PROBE_TIMEOUT):
+                try:
+                    candidate, final_url, auth_component, is_js = await next_done
+                except asyncio.TimeoutError:
+                    break
+                except Exception:
+                    continue
+                if auth_component is not None and auth_component.found:
+                    print(f"Static probe found login page: {final_url}")
+                    outcome.login_url = final_url
+                    outcome.auth_component = auth_component
+                    break
+                if is_js:
+                    js_rendered.add(candidate)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    outcome.js_candidates = [candidate for candidate in candidates if candidate in js_rendered]
+    return outcome
@@ -1,14 +1,33 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, File, HTTPException, Header, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import Optional, List
 import httpx
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 import asyncio
-from playwright.async_api import async_playwright, Browser, Page
+import io
+import time
+from models import ScrapeRequest, AuthComponent, ScrapeResult
+from detector import detect
+from parse_pool import start_parse_pool, close_parse_pool, detect_offloaded
+from http_pool import start_http_pool, close_http_pool, fetch
+from browser_pool import RenderResult
+from timings import recording, record
+from result_cache import ResultCache, CacheEntry, CachePolicy, ScrapeOrigin, parse_cache_control
+from single_flight import SingleFlight
+from batch_scheduler import BatchScheduler, BatchItem, work_slot
+from admission import ADMISSION_BATCH_TIMEOUT, ADMISSION_TIMEOUT, AdmissionRejected, admitted_as, client_identity, controller as admission
+from urls import normalize_url, domain_of, is_login_url
+from discovery_cache import Discovery, DiscoveryCache
+from login_probe import probe_login_paths
+from renderer import build_renderer
+from routing import Router
+from watchlist import PREDEFINED_URLS, Watchlist, WatchlistFull
+from jobs import ITEM_STATUSES, JobNotFound, JobQueue, JobTooLarge, read_url_lines
+from responses import FULL, CompressionMiddleware, FastJSONResponse, Projection, dumps
+import metrics
 
-app = FastAPI(title="Website Authentication Component Detector API")
+app = FastAPI(title="Website Authentication Component Detector API", default_response_class=FastJSONResponse)
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -23,372 +42,251 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 
-# Global Playwright browser instance
-_playwright = None
-_browser: Optional[Browser] = None
+# Scrape results keyed by normalized URL, and the scrapes currently running per URL
+_result_cache = ResultCache()
+_inflight = SingleFlight()
+
+# Login page URL per domain, persisted on disk and shared across worker processes
+_discovery_cache = DiscoveryCache()
+
+# Browser renders: in process, in separate render workers, or stubbed (RENDER_MODE)
+_renderer = build_renderer(_discovery_cache)
+
+# Per-domain history of which path (static or browser) finds login forms
+_router = Router()
+
+# Watched URLs refreshed in the background and served from snapshots (/api/predefined, /api/watchlist)
+_watchlist = Watchlist(lambda url: scrape_website(url, 'no-cache'))
+
+# Bulk scan jobs, checkpointed in SQLite and resumed after a restart (/api/jobs)
+_jobs = JobQueue(lambda url, cache_control: scrape_website(url, cache_control))
+
+metrics.registry.gauge(
+    'scraper_browser_contexts', 'Playwright context pool occupancy', ['state'],
+    lambda: {(state,): value for state, value in _renderer.pool_stats().items()},
+)
+metrics.registry.gauge(
+    'scraper_admission', 'Admission lane slots in use, queued requests and capacity', ['lane', 'state'],
+    lambda: {(lane, state): stats[key] for lane, stats in admission.stats().items()
+             for state, key in (('in_use', 'inUse'), ('queued', 'queued'), ('capacity', 'capacity'))},
+)
+metrics.registry.gauge(
+    'scraper_inflight_scrapes', 'Distinct URLs being scraped right now', (),
+    lambda: {(): _inflight.stats()['inFlight']},
+)
+metrics.registry.gauge(
+    'scraper_result_cache', 'Result cache size', ['measure'],
+    lambda: {(name,): _result_cache.stats()[name] for name in ('entries', 'bytes')},
+)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize Playwright browser on startup"""
-    global _playwright, _browser
-    try:
-        _playwright = await async_playwright().start()
-        _browser = await _playwright.chromium.launch(headless=True)
-    except Exception as e:
-        print(f"Warning: Could not initialize Playwright browser: {e}")
+    """Initialize shared HTTP pool, parse workers and the browser renderer on startup"""
+    await start_http_pool()
+    start_parse_pool()
+    await _renderer.start()
+    _watchlist.start()
+    _jobs.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close Playwright browser on shutdown"""
-    global _browser, _playwright
-    if _browser:
-        await _browser.close()
-    if _playwright:
-        await _playwright.stop()
-
-def is_login_url(url: str) -> bool:
-    """Check if URL appears to be a login/signin page"""
-    url_lower = url.lower()
-    login_keywords = ['login', 'signin', 'sign-in', 'sign_in', 'auth', 'authenticate', 'log-in']
-    return any(keyword in url_lower for keyword in login_keywords)
-
-async def find_and_click_login_link(page: Page, base_url: str) -> bool:
-    """Find and click login/signin link on the current page"""
-    try:
-        # Common selectors for login links
-        login_selectors = [
-            'a[href*="login"]',
-            'a[href*="signin"]',
-            'a[href*="sign-in"]',
-            'a[href*="auth"]',
-            'a:has-text("Sign in")',
-            'a:has-text("Sign In")',
-            'a:has-text("Login")',
-            'a:has-text("Log in")',
-            'a:has-text("Log In")',
-            'button:has-text("Sign in")',
-            'button:has-text("Login")',
-        ]
-        
-        # Domain-specific selectors
-        domain = base_url.lower()
-        if 'amazon.com' in domain:
-            login_selectors.extend([
-                '#nav-link-accountList',
-                'a[href*="ap/signin"]',
-            ])
-        elif 'github.com' in domain:
-            login_selectors.extend([
-                'a[href="/login"]',
-            ])
-        elif 'linkedin.com' in domain:
-            login_selectors.extend([
-                'a[href*="/login"]',
-            ])
-        
-        for selector in login_selectors:
-            try:
-                element = await page.query_selector(selector)
-                if element:
-                    # Check if element is visible
-                    is_visible = await element.is_visible()
-                    if is_visible:
-                        print(f"Found login link with selector: {selector}")
-                        await element.click()
-                        await asyncio.sleep(2)  # Wait for navigation
-                        return True
-            except:
-                continue
-        
-        return False
-    except Exception as e:
-        print(f"Error finding login link: {e}")
-        return False
-
-async def scrape_with_playwright(url: str) -> Optional[str]:
-    """Scrape website using Playwright for JavaScript-rendered content"""
-    global _browser
-    if not _browser:
-        return None
-    
-    try:
-        context = await _browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            locale='en-US'
-        )
-        page = await context.new_page()
-        
-        # Parse URL to get base domain
-        from urllib.parse import urlparse
-        parsed = urlparse(url)
-        base_domain = f"{parsed.scheme}://{parsed.netloc}"
-        
-        # Check if URL is already a login page
-        is_login = is_login_url(url)
-        
-        if not is_login:
-            # Step 1: Visit homepage first
-            print(f"URL doesn't appear to be a login page, visiting homepage: {base_domain}")
-            try:
-                await page.goto(base_domain, wait_until='domcontentloaded', timeout=15000)
-                await asyncio.sleep(2)  # Wait for page to load
-                
-                # Step 2: Try to find and click login link
-                print("Searching for login link on homepage...")
-                login_clicked = await find_and_click_login_link(page, base_domain)
-                
-                if not login_clicked:
-                    # If couldn't find login link, try common login URLs
-                    print("Could not find login link, trying common login URLs...")
-                    common_login_paths = ['/login', '/signin', '/sign-in', '/auth/login']
-                    for path in common_login_paths:
-                        try:
-                            login_url = f"{base_domain}{path}"
-                            await page.goto(login_url, wait_until='domcontentloaded', timeout=15000)
-                            await asyncio.sleep(2)
-                            # Check if we're on a login page now
-                            html_check = await page.content()
-                            if 'password' in html_check.lower() or 'login' in html_check.lower():
-                                print(f"Successfully navigated to login page: {login_url}")
-                                break
-                        except:
-                            continue
-            except Exception as e:
-                print(f"Error visiting homepage: {e}, trying original URL...")
-                await page.goto(url, wait_until='domcontentloaded', timeout=20000)
-        else:
-            # URL is already a login page, but for some sites (like Amazon) we still need to visit homepage first
-            if 'amazon.com' in base_domain.lower():
-                try:
-                    print("Visiting Amazon homepage to establish session...")
-                    await page.goto('https://www.amazon.com', wait_until='domcontentloaded', timeout=15000)
-                    await asyncio.sleep(2)  # Wait for cookies/session
-                    
-                    # Then navigate to signin
-                    login_clicked = await find_and_click_login_link(page, base_domain)
-                    if not login_clicked:
-                        await page.goto(url, wait_until='domcontentloaded', timeout=20000)
-                except:
-                    await page.goto(url, wait_until='domcontentloaded', timeout=20000)
-            else:
-                # Direct navigation to login URL
-                await page.goto(url, wait_until='domcontentloaded', timeout=20000)
-        
-        # Wait for page to fully load and JavaScript to execute
-        await asyncio.sleep(3)
-        
-        # Try to wait for login form elements to appear
-        try:
-            await page.wait_for_selector('input[type="password"], input[type="email"], input[name*="email"], input[name*="user"], input[id*="email"]', timeout=8000)
-            await asyncio.sleep(1)  # Additional wait after elements appear
-        except:
-            # Even if selector doesn't appear, continue to get HTML
-            pass
-        
-        # Get the rendered HTML
-        html = await page.content()
-        
-        await context.close()
-        return html
-    except Exception as e:
-        print(f"Playwright scraping error for {url}: {e}")
-        return None
+    """Close the browser renderer, parse workers and shared HTTP pool on shutdown"""
+    await _jobs.close()
+    await _watchlist.close()
+    await _renderer.close()
+    await close_http_pool()
+    close_parse_pool()
 
+async def scrape_with_playwright(url: str, login_candidates: Optional[List[str]] = None) -> RenderResult:
+    """Render the URL (or its login page) with the configured renderer"""
+    return await _renderer.render(url, login_candidates)
 
-class ScrapeRequest(BaseModel):
-    url: Optional[str] = None
-    urls: Optional[List[str]] = None
 
-class AuthComponent(BaseModel):
-    found: bool
-    htmlSnippet: Optional[str] = None
-    formElement: Optional[str] = None
-    usernameInput: Optional[str] = None
-    passwordInput: Optional[str] = None
-    submitButton: Optional[str] = None
-    method: Optional[str] = None
-    action: Optional[str] = None
-
-class ScrapeResult(BaseModel):
-    url: str
-    success: bool
-    error: Optional[str] = None
-    authComponent: Optional[AuthComponent] = None
+async def _record_discovery(url: str, render: RenderResult, found: bool) -> None:
+    """Remember where a domain's login page was found, or forget a cached one that failed"""
+    domain = domain_of(url)
+    if render.discovery == 'cache' and not found:
+        print(f"Cached login URL for {domain} no longer has a login form, invalidating")
+        await _discovery_cache.invalidate(domain)
+    elif render.discovery in ('link', 'common-path') and found and render.final_url:
+        await _discovery_cache.store(domain, render.final_url, render.discovery)
 
 def detect_auth_components(html: str, base_url: str) -> AuthComponent:
     """Detect authentication components in web pages with enhanced HTML parsing"""
-    soup = BeautifulSoup(html, 'lxml')
-    
-    # Find password input fields
-    password_inputs = soup.find_all('input', {'type': 'password'})
-    
-    if not password_inputs:
-        return AuthComponent(found=False)
-    
-    # Find the nearest parent form containing the password input
-    auth_form = None
-    form_element = None
-    
-    for password_input in password_inputs:
-        # First, try to find parent form
-        form = password_input.find_parent('form')
-        
-        if form:
-            auth_form = form
-            form_element = form
-            break
-        
-        # If no form tag found, search more broadly for containers with authentication elements
-        # Look for divs, sections, or other containers that might contain login forms
-        parent = password_input.parent
-        max_depth = 10  # Limit search depth
-        depth = 0
-        
-        while parent and parent.name and parent.name != 'body' and depth < max_depth:
-            depth += 1
-            
-            # Check for username/email inputs in the same container
-            # Look for various patterns: type, name, id, placeholder, aria-label
-            username_patterns = [
-                {'type': 'text'},
-                {'type': 'email'},
-                {'name': lambda x: x and any(k in x.lower() for k in ['user', 'login', 'email', 'account', 'phone'])},
-                {'id': lambda x: x and any(k in x.lower() for k in ['user', 'login', 'email', 'account', 'phone'])},
-                {'placeholder': lambda x: x and any(k in x.lower() for k in ['email', 'phone', 'user', 'account'])},
-                {'aria-label': lambda x: x and any(k in x.lower() for k in ['email', 'phone', 'user', 'account'])},
-            ]
-            
-            username_found = False
-            for pattern in username_patterns:
-                if parent.find('input', pattern):
-                    username_found = True
-                    break
-            
-            # Also check for password input in the same container
-            password_found = parent.find('input', {'type': 'password'}) is not None
-            
-            # If we found both username and password in the same container, this is likely an auth form
-            if username_found and password_found:
-                auth_form = parent
-                form_element = parent
-                break
-            
-            # Also check for common authentication container classes/ids
-            container_attrs = parent.attrs if hasattr(parent, 'attrs') else {}
-            class_names = ' '.join(container_attrs.get('class', [])).lower() if 'class' in container_attrs else ''
-            container_id = container_attrs.get('id', '').lower() if 'id' in container_attrs else ''
-            
-            auth_keywords = ['login', 'signin', 'sign-in', 'auth', 'authentication', 'form']
-            if any(keyword in class_names or keyword in container_id for keyword in auth_keywords):
-                if password_found:
-                    auth_form = parent
-                    form_element = parent
-                    break
-            
-            parent = parent.parent
-    
-    # If still no form found, try to find the closest meaningful container
-    if not auth_form:
-        first_password = password_inputs[0]
-        # Try to find a container div that likely contains the form
-        parent = first_password.parent
-        for _ in range(5):  # Go up to 5 levels
-            if parent and parent.name:
-                # Check if this container has multiple inputs (likely a form)
-                all_inputs = parent.find_all('input')
-                if len(all_inputs) >= 2:  # At least username and password
-                    auth_form = parent
-                    form_element = parent
-                    break
-            if parent:
-                parent = parent.parent
-            else:
-                break
-        
-        # Last resort: use password input's parent container
-        if not auth_form:
-            if first_password.parent:
-                auth_form = first_password.parent.parent if first_password.parent.parent else first_password.parent
-            else:
-                auth_form = first_password
-    
-    # Extract form-related information with enhanced patterns
-    username_input = None
-    if auth_form:
-        # Try multiple patterns to find username input
-        username_patterns = [
-            {'type': 'text'},
-            {'type': 'email'},
-            {'type': 'tel'},  # Phone number
-            {'name': lambda x: x and any(k in x.lower() for k in ['user', 'login', 'email', 'account', 'phone', 'mobile'])},
-            {'id': lambda x: x and any(k in x.lower() for k in ['user', 'login', 'email', 'account', 'phone', 'mobile'])},
-            {'placeholder': lambda x: x and any(k in x.lower() for k in ['email', 'phone', 'user', 'account', 'username'])},
-            {'aria-label': lambda x: x and any(k in x.lower() for k in ['email', 'phone', 'user', 'account'])},
-            {'autocomplete': lambda x: x and any(k in x.lower() for k in ['username', 'email', 'tel'])},
-        ]
-        
-        for pattern in username_patterns:
-            found = auth_form.find('input', pattern)
-            if found:
-                username_input = found
-                break
-    
-    password_input = auth_form.find('input', {'type': 'password'}) if auth_form else None
-    
-    # Enhanced submit button detection
-    submit_button = None
-    if auth_form:
-        submit_patterns = [
-            {'type': 'submit'},
-            {'type': 'button', 'class': lambda x: x and any(k in ' '.join(x).lower() if isinstance(x, list) else str(x).lower() for k in ['submit', 'login', 'sign'])},
-            {'type': 'button', 'id': lambda x: x and any(k in x.lower() for k in ['submit', 'login', 'sign'])},
-            {'type': 'button', 'name': lambda x: x and any(k in x.lower() for k in ['submit', 'login', 'sign'])},
-        ]
-        
-        for pattern in submit_patterns:
-            found = auth_form.find('input', pattern) or auth_form.find('button', pattern)
-            if found:
-                submit_button = found
-                break
-        
-        # Also check button text content
-        if not submit_button:
-            buttons = auth_form.find_all('button')
-            for button in buttons:
-                text = button.get_text().lower() if button.get_text() else ''
-                if any(k in text for k in ['sign in', 'login', 'log in', 'submit', 'continue', 'next']):
-                    submit_button = button
-                    break
+    return detect(html, base_url)
+
+# Enhanced headers to mimic real browser
+STATIC_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0',
+}
+
+async def scrape_website(url: str, cache_control: Optional[str] = None) -> ScrapeResult:
+    """Scrape website and attach the timings recorded along the way"""
+    started = time.perf_counter()
+    with recording() as timings:
+        result = await _cached_scrape(url, parse_cache_control(cache_control))
+        record('total', (time.perf_counter() - started) * 1000)
+    result.timings = timings
+    cache = result.cacheStatus or 'none'
+    metrics.scrape_requests.inc(cache=cache)
+    metrics.scrape_request_seconds.observe(timings['total'] / 1000, cache=cache)
+    metrics.observe_timings(timings)
+    return result
+
+async def _cached_scrape(url: str, policy: CachePolicy) -> ScrapeResult:
+    """Serve from the result cache; otherwise join or start the in-flight scrape for the URL"""
+    key = normalize_url(url)
+    if key is None:
+        origin = ScrapeOrigin()
+        return _count_scrape(await _scrape_website(url, origin), origin)
+    requested_url = url if urlparse(url).scheme else f"https://{url}"
     
-    # Get form method and action
-    method = 'GET'
-    action = base_url
+    entry = None
+    if policy.bypass:
+        _result_cache.count('bypassed')
+    else:
+        entry = _result_cache.get(key)
+        if entry is not None and entry.is_fresh(policy.max_age):
+            _result_cache.count('hits')
+            return entry.result.model_copy(update={'url': requested_url, 'cacheStatus': 'hit'})
     
-    if form_element and hasattr(form_element, 'get'):
-        method = form_element.get('method', 'GET').upper()
-        action_attr = form_element.get('action', '')
-        if action_attr:
-            try:
-                action = urljoin(base_url, action_attr)
-            except:
-                action = base_url
-        else:
-            action = base_url
+    # Concurrent callers for the same URL and cache policy share one revalidation/scrape;
+    # each gets its own copy of the result and of the stage timings
+    result, stage_timings = await _inflight.do(
+        _flight_key(key, policy), lambda: _timed_refresh(key, requested_url, entry, policy))
+    for name, elapsed_ms in stage_timings.items():
+        record(name, elapsed_ms)
+    return result.model_copy(update={'url': requested_url})
+
+def _flight_key(key: str, policy: CachePolicy) -> str:
+    """Only callers whose policy treats the result the same way (cacheStatus, storing it) share a scrape"""
+    if policy.no_store:
+        return f"{key} no-store"
+    if policy.no_cache:
+        return f"{key} no-cache"
+    return key
+
+async def _timed_refresh(key: str, url: str, entry: Optional[CacheEntry], policy: CachePolicy):
+    """Run the refresh with its own recorder, so callers that joined it get its timings too"""
+    with recording() as stage_timings:
+        result = await _refresh(key, url, entry, policy)
+    return result, stage_timings
+
+async def _refresh(key: str, url: str, entry: Optional[CacheEntry], policy: CachePolicy) -> ScrapeResult:
+    """Revalidate an expired entry, or scrape and store a fresh result"""
+    origin = ScrapeOrigin()
+    if entry is not None and entry.can_revalidate:
+        try:
+            async with work_slot('static'):
+                response = await fetch(url, headers={**STATIC_HEADERS, **entry.conditional_headers()})
+            if response.status_code == 304:
+                _result_cache.count('revalidated')
+                _result_cache.refresh(key)
+                return entry.result.model_copy(update={'cacheStatus': 'revalidated'})
+            if response.status_code == 200:
+                # Page changed: parse this body instead of fetching it again
+                _result_cache.count('changed')
+                origin.prefetched = response
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            print(f"Revalidation failed for {url}: {e}")
     
-    return AuthComponent(
-        found=True,
-        htmlSnippet=str(auth_form).strip() if auth_form else '',
-        formElement=str(form_element).strip() if form_element else '',
-        usernameInput=str(username_input).strip() if username_input else '',
-        passwordInput=str(password_input).strip() if password_input else '',
-        submitButton=str(submit_button).strip() if submit_button else '',
-        method=method,
-        action=action,
-    )
+    if not policy.bypass:
+        _result_cache.count('misses')
+    result = _count_scrape(await _scrape_website(url, origin), origin)
+    if result.success and not policy.no_store:
+        _result_cache.put(key, result.model_copy(), origin)
+    result.cacheStatus = 'bypass' if policy.bypass else 'miss'
+    return result
 
-async def scrape_website(url: str) -> ScrapeResult:
+def _count_scrape(result: ScrapeResult, origin: ScrapeOrigin) -> ScrapeResult:
+    if not result.success:
+        outcome = 'error'
+    else:
+        outcome = 'found' if result.authComponent and result.authComponent.found else 'not-found'
+    metrics.scrapes.inc(path=origin.path, result=outcome)
+    return result
+
+def _block_signal(html: str) -> Optional[str]:
+    """Why a static page looks like a block or interstitial page instead of the real one, if it does"""
+    html_lower = html.lower()
+    if len(html) < 1000:
+        return 'short-page'
+    if 'captcha' in html_lower:
+        return 'captcha'
+    if 'robot' in html_lower and 'detected' in html_lower:
+        return 'robot-check'
+    if 'access denied' in html_lower:
+        return 'access-denied'
+    if 'please enable javascript' in html_lower:
+        return 'js-required'
+    return None
+
+def _elapsed_ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
+
+async def _cached_login_page(url: str, discovered: Discovery) -> Optional[ScrapeResult]:
+    """Fetch a login page the static probe found directly instead of the homepage and the probe paths"""
+    domain = discovered.domain
+    started = time.perf_counter()
+    try:
+        async with work_slot('static'):
+            response = await fetch(discovered.login_url, headers=STATIC_HEADERS)
+        found = None
+        if response.status_code == 200:
+            found = await detect_offloaded(response.text, str(response.url))
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        print(f"Fetching cached login URL {discovered.login_url} failed: {e}")
+        return None
+    if found is not None and found.found:
+        print(f"Using cached login URL ({discovered.method}): {discovered.login_url}")
+        _router.observe(domain, 'static', True, _elapsed_ms(started))
+        return ScrapeResult(url=url, success=True, authComponent=found)
+    print(f"Cached login URL for {domain} no longer has a login form, invalidating")
+    await _discovery_cache.invalidate(domain)
+    return None
+
+async def _static_fallback(url: str, domain: str, origin: ScrapeOrigin) -> Optional[ScrapeResult]:
+    """Routed straight to the browser and the render gave nothing usable: try the static page after all"""
+    print(f"Playwright gave no usable page for {url}, falling back to a static fetch")
+    started = time.perf_counter()
+    try:
+        async with work_slot('static'):
+            response = await fetch(url, headers=STATIC_HEADERS)
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        print(f"Static fallback failed for {url}: {e}")
+        _router.observe(domain, 'static', False, _elapsed_ms(started))
+        return None
+    if response.status_code not in [200, 301, 302, 303, 307, 308]:
+        _router.observe(domain, 'static', False, _elapsed_ms(started), response.status_code in (403, 429, 503))
+        return None
+    html = response.text
+    origin.path = 'static'
+    origin.etag = response.headers.get('etag')
+    origin.last_modified = response.headers.get('last-modified')
+    auth_component = await detect_offloaded(html, url)
+    _router.observe(domain, 'static', auth_component.found, _elapsed_ms(started))
+    return ScrapeResult(url=url, success=True, authComponent=auth_component)
+
+async def _scrape_website(url: str, origin: ScrapeOrigin) -> ScrapeResult:
     """Scrape website and detect authentication components"""
     try:
         # Validate URL format
@@ -406,98 +304,186 @@ async def scrape_website(url: str) -> ScrapeResult:
                 error="Invalid URL format"
             )
         
-        # First, try static HTTP method (faster)
-        # Enhanced headers to mimic real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0',
-        }
-        
+        domain = domain_of(url)
         html = None
+        auth_component = None
         static_success = False
         needs_playwright = False
+        login_candidates = None
+        # Why the browser is needed, for metrics
+        escalation = None
         
-        async with httpx.AsyncClient(timeout=15.0, follow_redirects=True) as client:
+        # A login page found earlier for this domain saves the homepage and probe fetches.
+        # One that only a browser found is left to the browser path, which renders it.
+        discovered = None if is_login_url(url) else await _discovery_cache.lookup(domain)
+        static_probed = discovered is not None and discovered.method == 'static-probe'
+        
+        # Start with the path this domain's history favours. A body already fetched by a
+        # revalidation makes the static path free, and without a browser there is no choice.
+        route = 'static'
+        if origin.prefetched is None and _renderer.available:
+            if discovered is not None and not static_probed:
+                route = 'discovered'
+            else:
+                route = _router.choose(domain)
+        
+        if route == 'discovered':
+            print(f"Rendering {url} with Playwright, its login page was found by a browser ({discovered.method})")
+            needs_playwright = True
+            escalation = 'discovered'
+        elif route == 'browser':
+            print(f"Routing {url} straight to Playwright, static fetches keep failing on {domain}")
+            needs_playwright = True
+            escalation = 'routed'
+        else:
+            static_started = time.perf_counter()
+            blocked = False
             try:
-                response = await client.get(url, headers=headers)
+                response = origin.prefetched
+                origin.prefetched = None
+                checked_discovery = response is None and static_probed
+                if checked_discovery:
+                    cached = await _cached_login_page(url, discovered)
+                    if cached is not None:
+                        return cached
+                if response is None:
+                    async with work_slot('static'):
+                        response = await fetch(url, headers=STATIC_HEADERS)
                 
                 # Accept 200 and redirect status codes
                 if response.status_code in [200, 301, 302, 303, 307, 308]:
                     html = response.text
                     static_success = True
+                    origin.etag = response.headers.get('etag')
+                    origin.last_modified = response.headers.get('last-modified')
                     
                     # Check if we got meaningful content
                     if len(html) > 500:
                         # Detect authentication components from static HTML
-                        auth_component = detect_auth_components(html, url)
+                        auth_component = await detect_offloaded(html, url)
                         
                         # If found authentication component, return success
                         if auth_component.found:
+                            _router.observe(domain, 'static', True, _elapsed_ms(static_started))
                             return ScrapeResult(
                                 url=url,
                                 success=True,
                                 authComponent=auth_component
                             )
                         
-                        # If static method worked but no auth found, check if we need to use Playwright
-                        html_lower = html.lower()
-                        needs_playwright = (
-                            len(html) < 1000 or
-                            'captcha' in html_lower or
-                            ('robot' in html_lower and 'detected' in html_lower) or
-                            'access denied' in html_lower or
-                            'please enable javascript' in html_lower or
-                            ('amazon.com' in url.lower() and 'ap_error' in html_lower and len(html) < 5000)
-                        )
+                        # If static method worked but no auth found, check if we were served a block page
+                        escalation = _block_signal(html)
+                        blocked = escalation is not None
+                        needs_playwright = blocked
                         
-                        # If URL is not a login URL and no auth found, try Playwright to find login link
+                        # If URL is not a login URL and no auth found, probe common login paths statically,
+                        # then try Playwright to find login link
                         if not auth_component.found and not is_login_url(url):
+                            if static_probed and not checked_discovery:
+                                cached = await _cached_login_page(url, discovered)
+                                if cached is not None:
+                                    return cached
+                            probe = await probe_login_paths(url, STATIC_HEADERS)
+                            if probe.auth_component is not None:
+                                _router.observe(domain, 'static', True, _elapsed_ms(static_started))
+                                await _discovery_cache.store(domain, probe.login_url, 'static-probe')
+                                return ScrapeResult(
+                                    url=url,
+                                    success=True,
+                                    authComponent=probe.auth_component
+                                )
+                            # Only candidates that look JavaScript-rendered are worth a browser visit
+                            login_candidates = probe.js_candidates
                             needs_playwright = True
+                            escalation = escalation or 'no-login-form'
                             print(f"No login form found on homepage, will use Playwright to find login link...")
                         
                         # If static method worked, no auth found, and no need for Playwright, return result
                         if not needs_playwright:
+                            _router.observe(domain, 'static', False, _elapsed_ms(static_started))
                             return ScrapeResult(
                                 url=url,
                                 success=True,
                                 authComponent=auth_component
                             )
+                else:
+                    blocked = response.status_code in (403, 429, 503)
+                    escalation = 'http-status'
+            except AdmissionRejected:
+                raise
             except httpx.TimeoutException:
                 needs_playwright = True  # Will try Playwright
+                escalation = 'static-timeout'
             except Exception as e:
                 needs_playwright = True  # Will try Playwright
+                escalation = 'static-error'
+            _router.observe(domain, 'static', False, _elapsed_ms(static_started), blocked)
+            
+            # Renders that never find more than the static page are not worth repeating
+            if static_success and html and not _router.should_render(domain):
+                print(f"Skipping Playwright for {url}, renders have not found login forms on {domain}")
+                if auth_component is None:
+                    auth_component = await detect_offloaded(html, url)
+                return ScrapeResult(
+                    url=url,
+                    success=True,
+                    authComponent=auth_component
+                )
         
         # If static method failed, detected issues, or needs to find login link, try Playwright
         if needs_playwright or not static_success or (html and len(html) < 1000):
             print(f"Trying Playwright for {url}...")
-            playwright_html = await scrape_with_playwright(url)
+            metrics.escalations.inc(reason=escalation or 'short-page')
+            try:
+                async with work_slot('browser'):
+                    render_started = time.perf_counter()
+                    render = await scrape_with_playwright(url, login_candidates)
+                    render_ms = _elapsed_ms(render_started)
+            except AdmissionRejected:
+                if route in ('browser', 'discovered'):
+                    # Routing only reorders the paths: the static one has not been tried yet
+                    fallback = await _static_fallback(url, domain, origin)
+                    if fallback is not None:
+                        return fallback
+                if not (static_success and html):
+                    raise
+                # No browser capacity: answer from the static page rather than failing
+                print(f"Browser lane full, returning the static result for {url}")
+                return ScrapeResult(
+                    url=url,
+                    success=True,
+                    authComponent=auth_component or await detect_offloaded(html, url)
+                )
+            record('render', render_ms)
+            playwright_html = render.html
             
-            if playwright_html and len(playwright_html) > 500:
-                auth_component = detect_auth_components(playwright_html, url)
+            if render.auth_component is not None or (playwright_html and len(playwright_html) > 500):
+                origin.path = 'browser'
+                auth_component = render.auth_component or await detect_offloaded(playwright_html, url)
+                _router.observe(domain, 'browser', auth_component.found, render_ms)
+                await _record_discovery(url, render, auth_component.found)
                 return ScrapeResult(
                     url=url,
                     success=True,
-                    authComponent=auth_component
+                    authComponent=auth_component,
+                    renderStats=render.stats or None
                 )
-            elif static_success and html:
+            if _renderer.available:
+                _router.observe(domain, 'browser', False, render_ms)
+            if static_success and html:
                 # Playwright failed, but we have static HTML, return that
-                auth_component = detect_auth_components(html, url)
+                auth_component = await detect_offloaded(html, url)
                 return ScrapeResult(
                     url=url,
                     success=True,
                     authComponent=auth_component
                 )
         
+        if route in ('browser', 'discovered'):
+            fallback = await _static_fallback(url, domain, origin)
+            if fallback is not None:
+                return fallback
+        
         # Both methods failed
         if not static_success:
             return ScrapeResult(
@@ -507,12 +493,14 @@ async def scrape_website(url: str) -> ScrapeResult:
             )
         else:
             # Static method succeeded but no auth found
-            auth_component = detect_auth_components(html, url)
+            auth_component = await detect_offloaded(html, url)
             return ScrapeResult(
                 url=url,
                 success=True,
                 authComponent=auth_component
             )
+    except AdmissionRejected:
+        raise
     except httpx.TimeoutException:
         return ScrapeResult(
             url=url,
@@ -526,44 +514,317 @@ async def scrape_website(url: str) -> ScrapeResult:
             error=str(e) or "Unknown error occurred while scraping the website"
         )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    """Over capacity: tell the caller when to come back"""
+    return FastJSONResponse(
+        {"detail": str(exc), "lane": exc.lane, "reason": exc.reason},
+        status_code=exc.status,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def _client_of(request: Request) -> str:
+    """Who a request counts against for fair sharing (client headers count only from trusted proxies)"""
+    return client_identity(
+        request.client.host if request.client else None,
+        request.headers.get('x-client-id'),
+        request.headers.get('x-forwarded-for'),
+    )
+
+def _timeout_of(request: Request, default: float) -> float:
+    """Request deadline in seconds: X-Request-Timeout if given, never above the configured one"""
+    try:
+        return min(default, float(request.headers.get('x-request-timeout', default)))
+    except ValueError:
+        return default
+
 @app.get("/")
 async def root():
     return {"message": "Website Authentication Component Detector API"}
 
+def _projection(fields: Optional[str] = None, compact: bool = False, snippet_max: Optional[int] = None) -> Projection:
+    """Response shaping query parameters (see responses.py)"""
+    try:
+        return Projection.from_query(fields, compact, snippet_max)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _scrape_response(result: ScrapeResult, timings: bool, projection: Projection) -> Response:
+    """Shape the result; expose stage timings as a Server-Timing header, keeping them in the body only if asked"""
+    headers = {}
+    if result.timings:
+        headers['Server-Timing'] = metrics.server_timing(result.timings)
+    if not timings:
+        result.timings = None
+    return FastJSONResponse(projection.apply(result), headers=headers)
+
 @app.post("/api/scrape", response_model=ScrapeResult)
-async def scrape_single(request: ScrapeRequest):
+async def scrape_single(
+    request: ScrapeRequest,
+    http_request: Request,
+    timings: bool = True,
+    projection: Projection = Depends(_projection),
+    cache_control: Optional[str] = Header(None),
+):
     if not request.url:
         raise HTTPException(status_code=400, detail="Please provide url parameter")
     
-    return await scrape_website(request.url)
+    with admitted_as(_client_of(http_request), _timeout_of(http_request, ADMISSION_TIMEOUT)):
+        result = await scrape_website(request.url, cache_control)
+    return _scrape_response(result, timings, projection)
 
 @app.get("/api/scrape", response_model=ScrapeResult)
-async def scrape_single_get(url: str):
-    return await scrape_website(url)
+async def scrape_single_get(
+    url: str,
+    http_request: Request,
+    timings: bool = True,
+    projection: Projection = Depends(_projection),
+    cache_control: Optional[str] = Header(None),
+):
+    with admitted_as(_client_of(http_request), _timeout_of(http_request, ADMISSION_TIMEOUT)):
+        result = await scrape_website(url, cache_control)
+    return _scrape_response(result, timings, projection)
+
+def _batch_item_json(item: BatchItem, projection: Projection = FULL) -> str:
+    return dumps({
+        "index": item.index,
+        "url": item.url,
+        "elapsedMs": item.elapsed_ms,
+        "result": projection.apply(item.result),
+    })
 
 @app.post("/api/scrape/batch")
-async def scrape_batch(request: ScrapeRequest):
+async def scrape_batch(
+    request: ScrapeRequest,
+    http_request: Request,
+    stream: Optional[str] = None,
+    projection: Projection = Depends(_projection),
+    accept: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None),
+):
+    """Scrape a list of URLs with bounded, per-domain concurrency.
+
+    Results come back as one JSON body in request order, or, with
+    `?stream=ndjson` / `?stream=sse` (or a matching Accept header), streamed
+    one item at a time in completion order with their original index.
+    `compact`, `fields` and `snippet_max` shape every item.
+    """
     if not request.urls:
         raise HTTPException(status_code=400, detail="Please provide urls parameter")
     
-    import asyncio
-    results = await asyncio.gather(*[scrape_website(url) for url in request.urls])
-    return {"results": results}
+    urls = request.urls
+    if stream is None and accept:
+        if 'application/x-ndjson' in accept:
+            stream = 'ndjson'
+        elif 'text/event-stream' in accept:
+            stream = 'sse'
+    scheduler = BatchScheduler(lambda url: scrape_website(url, cache_control))
+    client = _client_of(http_request)
+    timeout = _timeout_of(http_request, ADMISSION_BATCH_TIMEOUT)
+    
+    if stream == 'ndjson':
+        async def ndjson_lines():
+            started = time.perf_counter()
+            with admitted_as(client, timeout):
+                async for item in scheduler.run(urls):
+                    yield _batch_item_json(item, projection) + "\n"
+            yield dumps({"done": True, "total": len(urls), "elapsedMs": round((time.perf_counter() - started) * 1000, 1)}) + "\n"
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+    
+    if stream == 'sse':
+        async def sse_events():
+            started = time.perf_counter()
+            with admitted_as(client, timeout):
+                async for item in scheduler.run(urls):
+                    yield f"event: result\nid: {item.index}\ndata: {_batch_item_json(item, projection)}\n\n"
+            done = dumps({"total": len(urls), "elapsedMs": round((time.perf_counter() - started) * 1000, 1)})
+            yield f"event: done\ndata: {done}\n\n"
+        return StreamingResponse(sse_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    
+    if stream is not None:
+        raise HTTPException(status_code=400, detail="stream must be 'ndjson' or 'sse'")
+    
+    results: List[Optional[dict]] = [None] * len(urls)
+    with admitted_as(client, timeout):
+        async for item in scheduler.run(urls):
+            results[item.index] = projection.apply(item.result)
+    return FastJSONResponse({"results": results})
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {**_result_cache.stats(), 'inflight': _inflight.stats(), 'discovery': _discovery_cache.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/routing/stats")
+async def routing_stats(domain: Optional[str] = None):
+    """Static vs browser outcomes per domain, optionally for a single domain"""
+    return _router.stats(domain_of(domain) if domain else None)
+
+@app.get("/api/admission/stats")
+async def admission_stats():
+    """Per-lane capacity, queue depth and rejection counts (for autoscaling)"""
+    return admission.stats()
+
+@app.get("/api/render/health")
+async def render_health(response: Response):
+    """Browser renderer status (in-process browser or render workers); 503 when renders cannot run"""
+    health = await _renderer.health()
+    if health['status'] != 'up':
+        response.status_code = 503
+    return health
+
+async def _snapshot_results(urls: List[str], projection: Projection) -> Response:
+    """Serve watched URLs from their latest snapshots (unwatched ones are scraped now)"""
+    async def one(url: str):
+        snapshot = await _watchlist.get(url)
+        if snapshot is None:
+            return await scrape_website(url), 0.0, False
+        return snapshot.result.model_copy(update={'url': url}), snapshot.age, _watchlist.is_stale(snapshot)
+
+    items = await asyncio.gather(*(one(url) for url in urls))
+    results = []
+    for result, age, stale in items:
+        item = projection.apply(result)
+        item['snapshotAgeSeconds'] = round(age, 1)
+        item['stale'] = stale
+        results.append(item)
+    oldest = max((age for _, age, _ in items), default=0.0)
+    return FastJSONResponse(
+        {
+            "results": results,
+            "snapshot": {"ageSeconds": round(oldest, 1), "stale": any(stale for _, _, stale in items)},
+        },
+        headers={"Age": str(int(oldest))},
+    )
 
 @app.get("/api/predefined")
-async def scrape_predefined():
-    # Predefined 5 different types of websites (using static HTML sites)
-    predefined_websites = [
-        'https://github.com/login',
-        'https://stackoverflow.com/users/login',
-        'https://www.linkedin.com/login',
-        'https://www.quora.com/login',
-        'https://www.dropbox.com/login',
-    ]
-    
-    import asyncio
-    results = await asyncio.gather(*[scrape_website(url) for url in predefined_websites])
-    return {"results": results}
+async def scrape_predefined(projection: Projection = Depends(_projection)):
+    """The predefined websites, served from background-refreshed snapshots"""
+    return await _snapshot_results(PREDEFINED_URLS, projection)
+
+@app.get("/api/watchlist")
+async def watchlist_status():
+    """Watched URLs with their snapshot age and refresh history"""
+    return _watchlist.stats()
+
+@app.get("/api/watchlist/results")
+async def watchlist_results(projection: Projection = Depends(_projection)):
+    """Latest snapshot of every watched URL"""
+    return await _snapshot_results(_watchlist.urls(), projection)
+
+@app.post("/api/watchlist")
+async def watchlist_add(request: ScrapeRequest):
+    """Watch more URLs; their first refresh starts immediately"""
+    urls = request.urls or ([request.url] if request.url else [])
+    if not urls:
+        raise HTTPException(status_code=400, detail="Please provide url or urls parameter")
+    try:
+        added = await _watchlist.add(urls)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WatchlistFull as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"added": added, "watching": len(_watchlist.urls())}
+
+def _job_item_json(item: dict, projection: Projection) -> dict:
+    if item['result'] is not None:
+        item['result'] = projection.apply(item['result'])
+    return item
+
+def _job_status_filter(status: Optional[str]) -> Optional[str]:
+    if status is not None and status not in ITEM_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(ITEM_STATUSES)}")
+    return status
+
+@app.post("/api/jobs", status_code=202)
+async def job_submit(request: ScrapeRequest, cache_control: Optional[str] = Header(None)):
+    """Queue a bulk scan of a URL list; returns the job id to poll for progress and results"""
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="Please provide urls parameter")
+    try:
+        job_id = await _jobs.submit(request.urls, cache_control)
+    except JobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return await _jobs.status(job_id)
+
+@app.post("/api/jobs/upload", status_code=202)
+async def job_upload(file: UploadFile = File(...), cache_control: Optional[str] = Header(None)):
+    """Queue a bulk scan of an uploaded list: one URL per line, or a CSV with URLs in the first column"""
+    # Read line by line from the spooled upload so large lists never sit in memory whole
+    lines = io.TextIOWrapper(file.file, encoding='utf-8', errors='replace')
+    try:
+        job_id = await _jobs.submit(read_url_lines(lines), cache_control)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="The uploaded file contains no URLs")
+    except JobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        lines.detach()
+    return await _jobs.status(job_id)
+
+@app.get("/api/jobs")
+async def job_list(limit: int = 20):
+    """Most recent jobs with their progress, and this process's job workers"""
+    return {"jobs": await _jobs.recent(max(1, min(limit, 200))), "workers": _jobs.stats()}
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Progress counters of a job"""
+    try:
+        return await _jobs.status(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+@app.get("/api/jobs/{job_id}/results")
+async def job_results(
+    job_id: str,
+    after: int = -1,
+    limit: int = 100,
+    status: Optional[str] = None,
+    stream: Optional[str] = None,
+    projection: Projection = Depends(_projection),
+):
+    """Finished items of a job in list order.
+
+    Pages hold items with an index above `after`; pass the returned `next`
+    as `after` to get the following page. Results can be read while the job
+    is still running. `?stream=ndjson` streams every finished item instead.
+    `status` filters by item status (done, failed, pending, ...).
+    """
+    status = _job_status_filter(status)
+    try:
+        progress = await _jobs.status(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if stream == 'ndjson':
+        async def ndjson_lines():
+            async for item in _jobs.iter_results(job_id, status):
+                yield dumps(_job_item_json(item, projection)) + "\n"
+            yield dumps({"done": True, "job": await _jobs.status(job_id)}) + "\n"
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+    if stream is not None:
+        raise HTTPException(status_code=400, detail="stream must be 'ndjson'")
+
+    items = await _jobs.page(job_id, after, max(1, min(limit, 1000)), status)
+    return FastJSONResponse({
+        "job": progress,
+        "results": [_job_item_json(item, projection) for item in items],
+        "next": items[-1]['index'] if items else None,
+    })
+
+@app.delete("/api/jobs/{job_id}")
+async def job_cancel(job_id: str):
+    """Cancel a job; items already finished keep their results"""
+    try:
+        await _jobs.cancel(job_id)
+        return await _jobs.status(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Job not found")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,168 @@
+"""Minimal Prometheus-format metrics (counters, gauges, histograms) for /metrics.
+
+Kept in-house to avoid a dependency: recording is a dict lookup plus a
+bisect, cheap enough to leave on for every scrape. Label values must come
+from small fixed sets (stage names, paths, statuses), never from URLs.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans a prefiltered page (sub-millisecond) to a slow browser render
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}"
+
+
+class Gauge(_Metric):
+    """Gauge read from a callback at scrape time, returning {label values: value}"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 read: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, help, labels)
+        self.read = read
+
+    def samples(self) -> Iterable[str]:
+        if self.read is None:
+            return
+        for key, value in self.read().items():
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self._series[key] = series
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> Iterable[str]:
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_number(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_number(round(total, 6))}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (),
+              read: Optional[Callable[[], Dict[LabelValues, float]]] = None) -> Gauge:
+        return self.register(Gauge(name, help, labels, read))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+scrape_requests = registry.counter(
+    'scraper_requests_total', 'Scrape requests by cache outcome', ['cache'])
+scrape_request_seconds = registry.histogram(
+    'scraper_request_seconds', 'End-to-end scrape request latency', ['cache'])
+scrapes = registry.counter(
+    'scraper_scrapes_total', 'Scrapes actually run (not served from cache), by final path and result', ['path', 'result'])
+escalations = registry.counter(
+    'scraper_escalations_total', 'Scrapes that fell back from the static path to a browser render', ['reason'])
+admission_rejections = registry.counter(
+    'scraper_admission_rejections_total', 'Scrape work turned away by admission control', ['lane', 'reason'])
+job_items = registry.counter(
+    'scraper_job_items_total', 'Bulk job items processed, by outcome (done, failed, retried, deferred)', ['outcome'])
+stage_seconds = registry.histogram(
+    'scraper_stage_seconds', 'Time spent per scrape stage (fetch, parse, probe, render, waits, ...)', ['stage'])
+
+
+def observe_timings(timings: Dict[str, float]) -> None:
+    """Feed one scrape's stage timings (milliseconds) into the stage histogram"""
+    for stage, elapsed_ms in timings.items():
+        if stage != 'total':
+            stage_seconds.observe(elapsed_ms / 1000, stage=stage)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Render stage timings as a Server-Timing header value"""
+    return ', '.join(f"{stage};dur={elapsed_ms}" for stage, elapsed_ms in timings.items())
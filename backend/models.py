@@ -0,0 +1,35 @@
+"""Request and response models shared by the API and the detector"""
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class ScrapeRequest(BaseModel):
+    url: Optional[str] = None
+    urls: Optional[List[str]] = None
+
+class AuthComponent(BaseModel):
+    found: bool
+    htmlSnippet: Optional[str] = None
+    formElement: Optional[str] = None
+    usernameInput: Optional[str] = None
+    passwordInput: Optional[str] = None
+    submitButton: Optional[str] = None
+    method: Optional[str] = None
+    action: Optional[str] = None
+    # CSS paths of the chosen elements by role: container, form, username, password, submit
+    selectors: Optional[Dict[str, str]] = None
+    # Which parser tier decided the result: "prefilter", "lxml" or "bs4"
+    parserTier: Optional[str] = None
+
+class ScrapeResult(BaseModel):
+    url: str
+    success: bool
+    error: Optional[str] = None
+    authComponent: Optional[AuthComponent] = None
+    # Milliseconds spent per stage/wait, e.g. {"fetch": 84.2, "wait.auth_fields": 412.3, "total": 2950.1}
+    timings: Optional[Dict[str, float]] = None
+    # Request-blocking counters from the Playwright render, when one ran
+    renderStats: Optional[Dict[str, int]] = None
+    # Result cache outcome: "hit", "revalidated", "miss" or "bypass"
+    cacheStatus: Optional[str] = None
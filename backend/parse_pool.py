@@ -0,0 +1,113 @@
+"""Worker pool that keeps HTML parsing and detection off the event loop.
+
+Large pages are handed to worker processes through shared memory instead of
+being pickled through the executor's pipe; only the small AuthComponent
+result travels back.
+"""
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+from config import env_int, env_str
+from detector import detect, might_have_password_input
+from models import AuthComponent
+from timings import stage
+
+# 'process' (default), 'thread', or 'inline' (parse on the event loop)
+PARSE_POOL_MODE = (env_str('PARSE_POOL_MODE', 'process') or 'process').lower()
+PARSE_POOL_WORKERS = env_int('PARSE_POOL_WORKERS', os.cpu_count() or 2)
+# Pages at least this large (UTF-8 bytes) go to process workers via shared memory
+PARSE_SHM_THRESHOLD = env_int('PARSE_SHM_THRESHOLD', 256 * 1024)
+
+_executor: Optional[Executor] = None
+
+
+def _detect_from_shared_memory(name: str, size: int, base_url: str) -> AuthComponent:
+    """Process-pool entry point: read the page out of a shared memory block"""
+    # Spawned workers share the parent's resource tracker, and the parent unlinks the block
+    shm = SharedMemory(name=name)
+    try:
+        html = bytes(shm.buf[:size]).decode('utf-8')
+    finally:
+        shm.close()
+    return detect(html, base_url)
+
+
+def _build_executor() -> Optional[Executor]:
+    if PARSE_POOL_MODE == 'inline':
+        return None
+    workers = max(1, PARSE_POOL_WORKERS)
+    if PARSE_POOL_MODE == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parse')
+    # spawn, not fork: the API process runs threads (event loop, Playwright driver)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+
+
+def start_parse_pool() -> None:
+    """Create the executor (called from the app startup hook)"""
+    global _executor
+    if _executor is None:
+        _executor = _build_executor()
+        if isinstance(_executor, ProcessPoolExecutor):
+            # Spawn the workers now rather than on the first large page
+            for _ in range(max(1, PARSE_POOL_WORKERS)):
+                _executor.submit(len, '')
+
+
+def close_parse_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _run_in_processes(executor: Executor, html: str, base_url: str) -> AuthComponent:
+    loop = asyncio.get_running_loop()
+    data = html.encode('utf-8')
+    if len(data) < PARSE_SHM_THRESHOLD:
+        return await loop.run_in_executor(executor, detect, html, base_url)
+
+    size = len(data)
+    shm = SharedMemory(create=True, size=size)
+    try:
+        shm.buf[:size] = data
+        del data
+        return await loop.run_in_executor(
+            executor, _detect_from_shared_memory, shm.name, size, base_url
+        )
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+async def detect_offloaded(html: str, base_url: str) -> AuthComponent:
+    """Detect auth components without blocking the event loop"""
+    global _executor
+    with stage('parse'):
+        # The prefilter is cheaper than a round trip to a worker
+        if not might_have_password_input(html):
+            return AuthComponent(found=False, parserTier='prefilter')
+
+        executor = _executor
+        if executor is None:
+            if PARSE_POOL_MODE == 'inline':
+                return detect(html, base_url)
+            start_parse_pool()
+            executor = _executor
+
+        if isinstance(executor, ProcessPoolExecutor):
+            try:
+                return await _run_in_processes(executor, html, base_url)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM on a huge page); replace the pool and parse in a thread this time
+                print("Parse worker pool broke, restarting it")
+                if _executor is executor:
+                    _executor = _build_executor()
+                return await asyncio.to_thread(detect, html, base_url)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, detect, html, base_url)
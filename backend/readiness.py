@@ -0,0 +1,129 @@
+"""Event-driven page readiness checks for Playwright renders.
+
+These replace fixed sleeps: each wait resolves as soon as its signal fires
+(a selector appears, navigation commits, the DOM stops mutating) and never
+runs past the scrape's overall latency budget. Actual wait durations are
+recorded as `wait.<label>` timings.
+"""
+import time
+from typing import Optional
+
+from playwright.async_api import Page
+
+from config import env_float, env_int
+from timings import record
+
+# Overall time allowed for one browser scrape, in seconds
+BROWSER_SCRAPE_BUDGET = env_float('BROWSER_SCRAPE_BUDGET', 25.0)
+# How long the DOM must go without mutations to count as settled
+DOM_QUIET_MS = env_int('DOM_QUIET_MS', 300)
+
+AUTH_FIELD_SELECTOR = 'input[type="password"], input[type="email"], input[name*="email"], input[name*="user"], input[id*="email"]'
+
+_DOM_QUIET_SCRIPT = """
+([quietMs, timeoutMs]) => new Promise((resolve) => {
+    let quietTimer = null;
+    let limitTimer = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(() => done(true), quietMs);
+    });
+    const done = (quiet) => {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(limitTimer);
+        resolve(quiet);
+    };
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    quietTimer = setTimeout(() => done(true), quietMs);
+    limitTimer = setTimeout(() => done(false), timeoutMs);
+})
+"""
+
+
+class LatencyBudget:
+    """Deadline shared by every wait in a single scrape"""
+
+    def __init__(self, seconds: float = BROWSER_SCRAPE_BUDGET):
+        self.deadline = time.monotonic() + seconds
+
+    def remaining_ms(self) -> int:
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0
+
+    def timeout_ms(self, cap_ms: int) -> int:
+        """Timeout for the next step: the cap, cut short by the budget.
+
+        Never returns 0 because Playwright treats 0 as "no timeout".
+        """
+        return max(1, min(cap_ms, self.remaining_ms()))
+
+
+def _record_wait(label: str, started: float) -> None:
+    record(f"wait.{label}", (time.perf_counter() - started) * 1000)
+
+
+async def wait_for_auth_fields(page: Page, budget: LatencyBudget, cap_ms: int, label: str) -> bool:
+    """Wait until a username/password style input is visible"""
+    started = time.perf_counter()
+    if budget.expired:
+        return False
+    try:
+        await page.wait_for_selector(AUTH_FIELD_SELECTOR, timeout=budget.timeout_ms(cap_ms))
+        return True
+    except Exception:
+        return False
+    finally:
+        _record_wait(label, started)
+
+
+async def wait_for_dom_quiet(
+    page: Page,
+    budget: LatencyBudget,
+    cap_ms: int,
+    label: str,
+    quiet_ms: int = DOM_QUIET_MS,
+) -> bool:
+    """Wait until the DOM has gone `quiet_ms` without mutations"""
+    started = time.perf_counter()
+    if budget.expired:
+        return False
+    try:
+        return bool(await page.evaluate(_DOM_QUIET_SCRIPT, [quiet_ms, budget.timeout_ms(cap_ms)]))
+    except Exception:
+        # Navigation destroyed the execution context; the new page is loading
+        return False
+    finally:
+        _record_wait(label, started)
+
+
+async def wait_for_navigation_or_form(
+    page: Page,
+    budget: LatencyBudget,
+    cap_ms: int,
+    label: str,
+    previous_url: Optional[str] = None,
+) -> bool:
+    """After a click: wait for the next document to commit, then for auth fields.
+
+    In-page login modals never navigate, so a short URL-change wait falls
+    through to the auth-field wait instead of failing.
+    """
+    started = time.perf_counter()
+    try:
+        if previous_url is not None and not budget.expired:
+            try:
+                await page.wait_for_url(
+                    lambda current: current != previous_url,
+                    wait_until='commit',
+                    timeout=budget.timeout_ms(min(cap_ms, 1500)),
+                )
+                await page.wait_for_load_state('domcontentloaded', timeout=budget.timeout_ms(cap_ms))
+            except Exception:
+                pass
+        return await wait_for_auth_fields(page, budget, cap_ms, f"{label}.form")
+    finally:
+        _record_wait(label, started)
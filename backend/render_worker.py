@@ -0,0 +1,121 @@
+"""Render worker: a browser in its own process, serving renders to API workers.
+
+    python render_worker.py [--host 127.0.0.1] [--port 9100] [--processes N] [--stub]
+
+Speaks the line-delimited JSON protocol described in renderer.py. Renders
+beyond the context pool size queue inside the worker (BROWSER_POOL_SIZE,
+BROWSER_POOL_ACQUIRE_TIMEOUT). `--processes N` runs N workers on
+consecutive ports; list them all in the API's RENDER_SERVICE_ADDRS.
+`--stub` serves plain HTTP fetches instead of launching a browser.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import signal
+import time
+from typing import Any, Dict
+
+from config import env_int, env_str
+from discovery_cache import DiscoveryCache
+from http_pool import close_http_pool, start_http_pool
+from renderer import RENDER_MAX_MESSAGE_BYTES, LocalRenderer, StubRenderer, result_to_dict
+from timings import recording
+
+RENDER_WORKER_HOST = env_str('RENDER_WORKER_HOST', '127.0.0.1')
+RENDER_WORKER_PORT = env_int('RENDER_WORKER_PORT', 9100)
+
+
+class RenderWorker:
+    def __init__(self, stub: bool = False):
+        self.renderer = StubRenderer() if stub else LocalRenderer(DiscoveryCache())
+        self.started = time.time()
+        self.served = 0
+
+    async def handle_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        op = message.get('op')
+        if op == 'render':
+            url = message.get('url')
+            if not isinstance(url, str) or not url:
+                return {'ok': False, 'error': 'render needs a url'}
+            with recording() as timings:
+                render = await self.renderer.render(url, message.get('loginCandidates'))
+            self.served += 1
+            return {'ok': True, 'result': result_to_dict(render), 'timings': timings}
+        if op == 'health':
+            health = await self.renderer.health()
+            health.update({'served': self.served, 'uptime': round(time.time() - self.started, 1)})
+            return {'ok': True, 'health': health}
+        return {'ok': False, 'error': f"unknown op {op!r}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    response = {'ok': False, 'error': 'invalid JSON'}
+                else:
+                    response = await self.handle_message(message)
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            print(f"Render worker connection error: {e}")
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int, stub: bool = False) -> None:
+    worker = RenderWorker(stub)
+    await start_http_pool()
+    await worker.renderer.start()
+    server = await asyncio.start_server(worker.handle_connection, host, port, limit=RENDER_MAX_MESSAGE_BYTES)
+    print(f"Render worker ({worker.renderer.mode}) listening on {host}:{port}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        await worker.renderer.close()
+        await close_http_pool()
+
+
+def _run(host: str, port: int, stub: bool) -> None:
+    asyncio.run(serve(host, port, stub))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Playwright render worker')
+    parser.add_argument('--host', default=RENDER_WORKER_HOST)
+    parser.add_argument('--port', type=int, default=RENDER_WORKER_PORT)
+    parser.add_argument('--processes', type=int, default=1, help='workers to run, on consecutive ports')
+    parser.add_argument('--stub', action='store_true', help='fetch pages over plain HTTP instead of rendering')
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run(args.host, args.port, args.stub)
+        return
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=_run, args=(args.host, args.port + index, args.stub), name=f"render-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,508 @@
+"""Browser rendering behind one interface, in process or in separate render workers.
+
+RENDER_MODE picks the implementation the API uses:
+
+    local   Playwright in the API process (one browser per uvicorn worker)
+    remote  render workers (render_worker.py) reached over TCP, so API workers
+            scale with CPU while browser capacity is sized separately
+    stub    plain HTTP fetches without JavaScript, for tests and benchmarks
+
+The wire protocol is one JSON object per line in each direction:
+{"op": "render", "url": ..., "loginCandidates": [...]} answered by
+{"ok": true, "result": {...}, "timings": {...}}, and {"op": "health"}.
+"""
+import asyncio
+import contextlib
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from playwright.async_api import Page, async_playwright
+
+from browser_pool import BrowserContextPool, BrowserPoolTimeout, RenderResult
+from config import env_float, env_int, env_list, env_str
+from discovery_cache import DiscoveryCache
+from dom_extraction import BROWSER_EXTRACTION, extract_auth_component
+from http_pool import fetch
+from login_locator import candidate_locator, locate_login_links, warmup_url
+from login_probe import candidate_urls
+from models import AuthComponent
+from readiness import LatencyBudget, wait_for_auth_fields, wait_for_dom_quiet, wait_for_navigation_or_form
+from timings import record
+from urls import domain_of, is_login_url
+
+# 'local' (default), 'remote' or 'stub'
+RENDER_MODE = (env_str('RENDER_MODE', 'local') or 'local').lower()
+# Render workers for RENDER_MODE=remote, as host:port pairs
+RENDER_SERVICE_ADDRS = env_list('RENDER_SERVICE_ADDRS', ['127.0.0.1:9100'])
+# Seconds a remote render may take, including the worker's queue wait
+RENDER_SERVICE_TIMEOUT = env_float('RENDER_SERVICE_TIMEOUT', 90.0)
+RENDER_SERVICE_CONNECT_TIMEOUT = env_float('RENDER_SERVICE_CONNECT_TIMEOUT', 2.0)
+# Seconds an unreachable render worker is skipped before it is tried again
+RENDER_SERVICE_RETRY_AFTER = env_float('RENDER_SERVICE_RETRY_AFTER', 5.0)
+# Seconds between health checks (browser liveness locally, worker reachability remotely)
+RENDER_HEALTH_INTERVAL = env_float('RENDER_HEALTH_INTERVAL', 15.0)
+# Minimum seconds between browser relaunches after crashes
+RENDER_RESTART_BACKOFF = env_float('RENDER_RESTART_BACKOFF', 5.0)
+# Longest protocol line (a rendered page) either side will read
+RENDER_MAX_MESSAGE_BYTES = env_int('RENDER_MAX_MESSAGE_BYTES', 64 * 1024 * 1024)
+
+
+def result_to_dict(render: RenderResult) -> Dict[str, Any]:
+    return {
+        'html': render.html,
+        'stats': render.stats,
+        'finalUrl': render.final_url,
+        'discovery': render.discovery,
+        'authComponent': render.auth_component.model_dump() if render.auth_component else None,
+    }
+
+
+def result_from_dict(data: Dict[str, Any]) -> RenderResult:
+    component = data.get('authComponent')
+    return RenderResult(
+        html=data.get('html'),
+        stats=data.get('stats') or {},
+        final_url=data.get('finalUrl'),
+        discovery=data.get('discovery'),
+        auth_component=AuthComponent.model_validate(component) if component else None,
+    )
+
+
+async def find_and_click_login_link(page: Page, base_url: str, budget: Optional[LatencyBudget] = None) -> bool:
+    """Find and click login/signin link on the current page"""
+    budget = budget or LatencyBudget()
+    try:
+        # One in-page evaluation ranks every visible candidate
+        candidates = await locate_login_links(page, base_url)
+        for candidate in candidates:
+            if budget.expired:
+                break
+            try:
+                print(f"Found login link: {candidate.describe()}")
+                previous_url = page.url
+                await candidate_locator(page, candidate).click(timeout=budget.timeout_ms(3000))
+                await wait_for_navigation_or_form(page, budget, 5000, 'login_click', previous_url)
+                return True
+            except Exception as e:
+                print(f"Could not click login link {candidate.describe()}: {e}")
+                continue
+        return False
+    except Exception as e:
+        print(f"Error finding login link: {e}")
+        return False
+
+
+async def render_login_page(
+    pool: BrowserContextPool,
+    discovery_cache: DiscoveryCache,
+    url: str,
+    login_candidates: Optional[List[str]] = None,
+) -> RenderResult:
+    """Scrape website using Playwright for JavaScript-rendered content.
+
+    `login_candidates` are login URLs to try when no login link is found;
+    by default the common login paths on the URL's domain.
+    """
+    try:
+        async with pool.lease() as lease:
+            page = lease.page
+            budget = LatencyBudget()
+
+            # Parse URL to get base domain
+            parsed = urlparse(url)
+            base_domain = f"{parsed.scheme}://{parsed.netloc}"
+
+            # Check if URL is already a login page
+            is_login = is_login_url(url)
+            discovered = None if is_login else await discovery_cache.lookup(domain_of(url))
+            discovery = None
+
+            if discovered:
+                # Login page already known for this domain: skip the homepage and link search
+                print(f"Using cached login URL ({discovered.method}): {discovered.login_url}")
+                discovery = 'cache'
+                await page.goto(discovered.login_url, wait_until='domcontentloaded', timeout=budget.timeout_ms(20000))
+            elif not is_login:
+                # Step 1: Visit homepage first
+                print(f"URL doesn't appear to be a login page, visiting homepage: {base_domain}")
+                try:
+                    await page.goto(base_domain, wait_until='domcontentloaded', timeout=budget.timeout_ms(15000))
+                    await wait_for_dom_quiet(page, budget, 2000, 'homepage')
+
+                    # Step 2: Try to find and click login link
+                    print("Searching for login link on homepage...")
+                    login_clicked = await find_and_click_login_link(page, base_domain, budget)
+                    if login_clicked:
+                        discovery = 'link'
+
+                    if not login_clicked:
+                        # If couldn't find login link, try candidate login URLs
+                        if login_candidates is None:
+                            login_candidates = candidate_urls(url)
+                        print(f"Could not find login link, trying {len(login_candidates)} candidate login URLs...")
+                        for login_url in login_candidates:
+                            try:
+                                await page.goto(login_url, wait_until='domcontentloaded', timeout=budget.timeout_ms(15000))
+                                # Check if we're on a login page now
+                                if await wait_for_auth_fields(page, budget, 2000, 'common_path'):
+                                    print(f"Successfully navigated to login page: {login_url}")
+                                    discovery = 'common-path'
+                                    break
+                            except:
+                                continue
+                except Exception as e:
+                    print(f"Error visiting homepage: {e}, trying original URL...")
+                    await page.goto(url, wait_until='domcontentloaded', timeout=budget.timeout_ms(20000))
+            else:
+                # URL is already a login page, but some sites (per the rule table) need a homepage session first
+                warmup = warmup_url(base_domain)
+                if warmup:
+                    try:
+                        print(f"Visiting {warmup} to establish session...")
+                        await page.goto(warmup, wait_until='domcontentloaded', timeout=budget.timeout_ms(15000))
+                        await wait_for_dom_quiet(page, budget, 2000, 'session')  # Wait for cookies/session
+
+                        # Then navigate to signin
+                        login_clicked = await find_and_click_login_link(page, base_domain, budget)
+                        if not login_clicked:
+                            await page.goto(url, wait_until='domcontentloaded', timeout=budget.timeout_ms(20000))
+                    except:
+                        await page.goto(url, wait_until='domcontentloaded', timeout=budget.timeout_ms(20000))
+                else:
+                    # Direct navigation to login URL
+                    await page.goto(url, wait_until='domcontentloaded', timeout=budget.timeout_ms(20000))
+
+            # Wait for login form elements to appear, then for the form to stop changing.
+            # Even if they never appear, continue to get HTML
+            if await wait_for_auth_fields(page, budget, 8000, 'auth_fields'):
+                await wait_for_dom_quiet(page, budget, 1000, 'settle')
+
+            # Detect inside the page when configured, otherwise get the rendered HTML
+            auth_component = None
+            html = None
+            if BROWSER_EXTRACTION == 'dom':
+                auth_component = await extract_auth_component(page, url)
+            if auth_component is None:
+                html = await page.content()
+            stats = lease.stats()
+            if stats.get('blockedRequests'):
+                print(f"Blocked {stats['blockedRequests']} requests while rendering {url}")
+            return RenderResult(
+                html=html,
+                stats=stats,
+                final_url=page.url,
+                discovery=discovery,
+                auth_component=auth_component,
+            )
+    except BrowserPoolTimeout as e:
+        print(f"Playwright pool busy for {url}: {e}")
+        return RenderResult()
+    except Exception as e:
+        print(f"Playwright scraping error for {url}: {e}")
+        return RenderResult()
+
+
+class LocalRenderer:
+    """Playwright browser and context pool owned by this process.
+
+    A browser that crashes or disconnects is relaunched on the next render
+    or health check, at most once per RENDER_RESTART_BACKOFF seconds. If no
+    browser could be launched at startup the renderer stays unavailable.
+    """
+    mode = 'local'
+
+    def __init__(self, discovery_cache: DiscoveryCache):
+        self.discovery_cache = discovery_cache
+        self._playwright = None
+        self._browser = None
+        self._pool: Optional[BrowserContextPool] = None
+        self._lock = asyncio.Lock()
+        self._launched = False
+        self._closed = False
+        self._last_launch = 0.0
+        self._monitor: Optional[asyncio.Task] = None
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def available(self) -> bool:
+        return self._launched and not self._closed
+
+    def _healthy(self) -> bool:
+        return self._pool is not None and self._browser is not None and self._browser.is_connected()
+
+    async def _launch(self) -> None:
+        self._last_launch = time.monotonic()
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(headless=True)
+        pool = BrowserContextPool(browser)
+        await pool.warm()
+        self._browser, self._pool = browser, pool
+
+    async def _teardown(self) -> None:
+        pool, browser = self._pool, self._browser
+        self._pool = self._browser = None
+        if pool:
+            await pool.close()
+        if browser:
+            try:
+                await browser.close()
+            except Exception as e:
+                print(f"Error closing browser: {e}")
+
+    async def start(self) -> None:
+        try:
+            await self._launch()
+            self._launched = True
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Warning: Could not initialize Playwright browser: {e}")
+            return
+        self._monitor = asyncio.create_task(self._watch())
+
+    async def _ensure(self) -> Optional[BrowserContextPool]:
+        """The live context pool, relaunching a crashed browser if the backoff allows"""
+        if self._healthy() or not self.available:
+            return self._pool
+        async with self._lock:
+            if self._healthy() or self._closed:
+                return self._pool
+            if time.monotonic() - self._last_launch < RENDER_RESTART_BACKOFF:
+                return None
+            print("Playwright browser is gone, relaunching")
+            await self._teardown()
+            try:
+                await self._launch()
+                self.restarts += 1
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Could not relaunch Playwright browser: {e}")
+        return self._pool
+
+    async def _watch(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(RENDER_HEALTH_INTERVAL)
+            try:
+                await self._ensure()
+            except Exception as e:
+                print(f"Browser health check failed: {e}")
+
+    async def render(self, url: str, login_candidates: Optional[List[str]] = None) -> RenderResult:
+        pool = await self._ensure()
+        if pool is None:
+            return RenderResult()
+        return await render_login_page(pool, self.discovery_cache, url, login_candidates)
+
+    def pool_stats(self) -> Dict[str, int]:
+        return self._pool.stats() if self._pool else {}
+
+    async def health(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'status': 'up' if self._healthy() else ('down' if self.available else 'unavailable'),
+            'restarts': self.restarts,
+            'lastError': self.last_error,
+            'pool': self.pool_stats(),
+        }
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._monitor:
+            self._monitor.cancel()
+        await self._teardown()
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+class StubRenderer:
+    """Stand-in that fetches pages over plain HTTP, for tests without a browser"""
+    mode = 'stub'
+    available = True
+
+    def __init__(self):
+        self.renders = 0
+
+    async def start(self) -> None:
+        pass
+
+    async def render(self, url: str, login_candidates: Optional[List[str]] = None) -> RenderResult:
+        self.renders += 1
+        try:
+            response = await fetch(url)
+        except Exception as e:
+            print(f"Stub render failed for {url}: {e}")
+            return RenderResult()
+        return RenderResult(html=response.text, final_url=str(response.url))
+
+    def pool_stats(self) -> Dict[str, int]:
+        return {}
+
+    async def health(self) -> Dict[str, Any]:
+        return {'mode': self.mode, 'status': 'up', 'renders': self.renders}
+
+    async def close(self) -> None:
+        pass
+
+
+@dataclass
+class _Endpoint:
+    host: str
+    port: int
+    in_flight: int = 0
+    down_until: float = 0.0
+    last_error: Optional[str] = None
+    last_health: Optional[Dict[str, Any]] = None
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def up(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+
+def _parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class RemoteRenderer:
+    """Client for render workers; each render goes to the least busy reachable one"""
+    mode = 'remote'
+
+    def __init__(self, addresses: List[str] = RENDER_SERVICE_ADDRS, timeout: float = RENDER_SERVICE_TIMEOUT):
+        self.endpoints = [_Endpoint(*_parse_address(address)) for address in addresses]
+        self.timeout = timeout
+        self._monitor: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> bool:
+        return any(endpoint.up for endpoint in self.endpoints)
+
+    async def start(self) -> None:
+        await self._check_all()
+        self._monitor = asyncio.create_task(self._watch())
+
+    async def _call(self, endpoint: _Endpoint, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Send one message; OSError means the worker is unreachable, anything else concerns this call only"""
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(endpoint.host, endpoint.port, limit=RENDER_MAX_MESSAGE_BYTES),
+                timeout=RENDER_SERVICE_CONNECT_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"connect timed out after {RENDER_SERVICE_CONNECT_TIMEOUT}s")
+        try:
+            writer.write(json.dumps(message).encode('utf-8') + b'\n')
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), timeout=timeout)
+        finally:
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+        if not line:
+            raise ConnectionError("render worker closed the connection")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error') or 'render worker error')
+        return response
+
+    def _mark_down(self, endpoint: _Endpoint, error: Exception) -> None:
+        endpoint.down_until = time.monotonic() + RENDER_SERVICE_RETRY_AFTER
+        endpoint.last_error = str(error) or type(error).__name__
+        print(f"Render worker {endpoint.address} unavailable: {endpoint.last_error}")
+
+    async def _check(self, endpoint: _Endpoint) -> None:
+        try:
+            response = await self._call(endpoint, {'op': 'health'}, RENDER_SERVICE_CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError, ValueError, RuntimeError) as e:
+            self._mark_down(endpoint, e)
+            return
+        endpoint.down_until = 0.0
+        endpoint.last_health = response.get('health')
+
+    async def _check_all(self) -> None:
+        await asyncio.gather(*(self._check(endpoint) for endpoint in self.endpoints))
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(RENDER_HEALTH_INTERVAL)
+            await self._check_all()
+
+    def _pick(self) -> Optional[_Endpoint]:
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.up]
+        if not candidates:
+            return None
+        fewest = min(endpoint.in_flight for endpoint in candidates)
+        return random.choice([endpoint for endpoint in candidates if endpoint.in_flight == fewest])
+
+    async def render(self, url: str, login_candidates: Optional[List[str]] = None) -> RenderResult:
+        endpoint = self._pick()
+        if endpoint is None:
+            print(f"No render worker reachable for {url}")
+            return RenderResult()
+        message = {'op': 'render', 'url': url, 'loginCandidates': login_candidates}
+        endpoint.in_flight += 1
+        try:
+            response = await self._call(endpoint, message, self.timeout)
+        except OSError as e:
+            self._mark_down(endpoint, e)
+            return RenderResult()
+        except (RuntimeError, asyncio.TimeoutError, ValueError) as e:
+            # A slow render, an oversized page or a garbled reply: this render failed, the worker is fine
+            print(f"Render worker {endpoint.address} failed on {url}: {str(e) or type(e).__name__}")
+            return RenderResult()
+        finally:
+            endpoint.in_flight -= 1
+        # The worker's own stage timings (waits, locate, extract) join this scrape's
+        for name, elapsed_ms in (response.get('timings') or {}).items():
+            record(name, elapsed_ms)
+        return result_from_dict(response.get('result') or {})
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Context pool occupancy summed over the workers, as of their last health check"""
+        totals: Dict[str, int] = {}
+        for endpoint in self.endpoints:
+            pool = (endpoint.last_health or {}).get('pool') or {}
+            for name, value in pool.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    async def health(self) -> Dict[str, Any]:
+        await self._check_all()
+        return {
+            'mode': self.mode,
+            'status': 'up' if self.available else 'down',
+            'workers': [
+                {
+                    'address': endpoint.address,
+                    'up': endpoint.up,
+                    'inFlight': endpoint.in_flight,
+                    'lastError': None if endpoint.up else endpoint.last_error,
+                    'health': endpoint.last_health if endpoint.up else None,
+                }
+                for endpoint in self.endpoints
+            ],
+        }
+
+    async def close(self) -> None:
+        if self._monitor:
+            self._monitor.cancel()
+
+
+def build_renderer(discovery_cache: DiscoveryCache, mode: str = RENDER_MODE):
+    """The renderer RENDER_MODE asks for"""
+    if mode == 'remote':
+        return RemoteRenderer()
+    if mode == 'stub':
+        return StubRenderer()
+    if mode != 'local':
+        print(f"Warning: unknown RENDER_MODE {mode!r}, rendering in process")
+    return LocalRenderer(discovery_cache)
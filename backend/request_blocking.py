@@ -0,0 +1,117 @@
+"""Route interception that drops requests a login-form render does not need"""
+from typing import Dict, FrozenSet, Tuple
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Request, Response, Route
+
+from config import env_bool, env_list
+
+BLOCK_REQUESTS = env_bool('BLOCK_REQUESTS', True)
+# Playwright resource types to drop; stylesheets are kept by default because
+# visibility checks on login links depend on them
+BLOCKED_RESOURCE_TYPES = env_list('BLOCKED_RESOURCE_TYPES', ['image', 'media', 'font'])
+
+DEFAULT_BLOCKED_DOMAINS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'doubleclick.net',
+    'adservice.google.com',
+    'connect.facebook.net',
+    'amazon-adsystem.com',
+    'scorecardresearch.com',
+    'hotjar.com',
+    'clarity.ms',
+    'bat.bing.com',
+    'segment.io',
+    'cdn.segment.com',
+    'optimizely.com',
+    'nr-data.net',
+    'criteo.com',
+    'taboola.com',
+    'outbrain.com',
+    'quantserve.com',
+]
+# Extra tracker domains, appended to the defaults
+BLOCKED_DOMAINS = DEFAULT_BLOCKED_DOMAINS + env_list('BLOCKED_DOMAINS', [])
+
+
+class BlockingStats:
+    """Request counters for a single render"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+        self.blocked_requests = 0
+        self.blocked_by_reason: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, int]:
+        # Blocked requests are never downloaded, so only the bytes that were
+        # actually loaded can be measured
+        stats = {
+            'allowedRequests': self.allowed_requests,
+            'allowedBytes': self.allowed_bytes,
+            'blockedRequests': self.blocked_requests,
+        }
+        for reason, count in self.blocked_by_reason.items():
+            stats[f"blocked.{reason}"] = count
+        return stats
+
+
+class RequestBlocker:
+    """Aborts requests by resource type or tracker domain for one browser context"""
+
+    def __init__(
+        self,
+        resource_types=BLOCKED_RESOURCE_TYPES,
+        domains=BLOCKED_DOMAINS,
+    ):
+        self.resource_types: FrozenSet[str] = frozenset(t.lower() for t in resource_types)
+        self.domains: Tuple[str, ...] = tuple(d.lower().lstrip('.') for d in domains)
+        self.stats = BlockingStats()
+
+    def _blocked_domain(self, url: str) -> bool:
+        host = (urlparse(url).hostname or '').lower()
+        return any(host == domain or host.endswith('.' + domain) for domain in self.domains)
+
+    def block_reason(self, request: Request) -> str:
+        """Return why the request should be dropped, or '' to let it through"""
+        resource_type = request.resource_type
+        if resource_type == 'document' and request.frame.parent_frame is None:
+            # Never block the page we were asked to render
+            return ''
+        if resource_type in self.resource_types:
+            return resource_type
+        if self._blocked_domain(request.url):
+            return 'tracker'
+        return ''
+
+    async def _handle_route(self, route: Route) -> None:
+        try:
+            reason = self.block_reason(route.request)
+        except Exception as e:
+            # e.g. service worker requests have no frame; let them through rather than stall them
+            print(f"Could not classify request {route.request.url}, allowing it: {e}")
+            await route.continue_()
+            return
+        if reason:
+            self.stats.blocked_requests += 1
+            self.stats.blocked_by_reason[reason] = self.stats.blocked_by_reason.get(reason, 0) + 1
+            await route.abort('blockedbyclient')
+        else:
+            await route.continue_()
+
+    def _on_response(self, response: Response) -> None:
+        self.stats.allowed_requests += 1
+        try:
+            self.stats.allowed_bytes += int(response.headers.get('content-length', 0))
+        except ValueError:
+            pass
+
+    async def install(self, context: BrowserContext) -> None:
+        await context.route('**/*', self._handle_route)
+        context.on('response', self._on_response)
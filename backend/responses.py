@@ -0,0 +1,144 @@
+"""Response encoding: field projection, snippet capping, fast JSON and compression.
+
+A full AuthComponent carries the container's HTML twice (`htmlSnippet` and,
+for real forms, an identical `formElement`), which can be hundreds of KB per
+item for div-based forms. Callers that only need the verdict can ask for a
+compact body:
+
+    ?compact=true          drop nulls and empty strings, drop formElement when
+                           it repeats htmlSnippet, cap snippets at
+                           RESPONSE_SNIPPET_MAX characters
+    ?snippet_max=N         cap each HTML snippet at N characters (0 omits them)
+    ?fields=found,method,action,selectors
+                           keep only these authComponent fields
+
+Cached results are stored in full and shaped per response.
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import env_int
+from models import AuthComponent, ScrapeResult
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Snippet cap applied by ?compact=true when no snippet_max is given
+RESPONSE_SNIPPET_MAX = env_int('RESPONSE_SNIPPET_MAX', 2000)
+# Smallest response body worth compressing, in bytes (0 disables compression)
+RESPONSE_GZIP_MIN_SIZE = env_int('RESPONSE_GZIP_MIN_SIZE', 1024)
+RESPONSE_GZIP_LEVEL = env_int('RESPONSE_GZIP_LEVEL', 6)
+
+SNIPPET_FIELDS = ('htmlSnippet', 'formElement', 'usernameInput', 'passwordInput', 'submitButton')
+AUTH_FIELDS = tuple(AuthComponent.model_fields)
+TRUNCATION_MARKER = '…'
+
+
+def dumps(content: Any) -> str:
+    """Serialize to a JSON string, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content).decode('utf-8')
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return super().render(content)
+
+
+@dataclass(frozen=True)
+class Projection:
+    fields: Optional[Tuple[str, ...]] = None
+    compact: bool = False
+    snippet_max: Optional[int] = None
+
+    @classmethod
+    def from_query(cls, fields: Optional[str] = None, compact: bool = False,
+                   snippet_max: Optional[int] = None) -> 'Projection':
+        """Build from query parameters; raises ValueError on unknown fields or a negative cap"""
+        selected = None
+        if fields:
+            selected = tuple(name.strip() for name in fields.split(',') if name.strip())
+            unknown = [name for name in selected if name not in AUTH_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown authComponent fields: {', '.join(unknown)}")
+        if snippet_max is not None and snippet_max < 0:
+            raise ValueError("snippet_max must be 0 or more")
+        if compact and snippet_max is None:
+            snippet_max = RESPONSE_SNIPPET_MAX
+        return cls(selected, compact, snippet_max)
+
+    @property
+    def is_full(self) -> bool:
+        return self.fields is None and not self.compact and self.snippet_max is None
+
+    def _shape_auth(self, component: Dict[str, Any]) -> Dict[str, Any]:
+        if self.compact and component.get('formElement') == component.get('htmlSnippet'):
+            component.pop('formElement', None)
+        if self.fields is not None:
+            component = {name: component[name] for name in self.fields if name in component}
+        if self.snippet_max is not None:
+            for name in SNIPPET_FIELDS:
+                value = component.get(name)
+                if not isinstance(value, str):
+                    continue
+                if self.snippet_max == 0:
+                    del component[name]
+                elif len(value) > self.snippet_max:
+                    component[name] = value[:self.snippet_max] + TRUNCATION_MARKER
+        return component
+
+    def apply(self, result: ScrapeResult) -> Dict[str, Any]:
+        """The result as a JSON-ready dict, shaped by this projection"""
+        data = result.model_dump(mode='json', exclude_none=self.compact)
+        if self.is_full:
+            return data
+        component = data.get('authComponent')
+        if component:
+            if self.compact:
+                component = {name: value for name, value in component.items() if value != ''}
+            data['authComponent'] = self._shape_auth(component)
+        return data
+
+
+FULL = Projection()
+
+
+class CompressionMiddleware:
+    """GZip for buffered responses; streamed batch results (NDJSON, SSE) pass through.
+
+    Starlette's gzip writer does not flush per chunk, so a compressed stream
+    would hold items back until its buffer fills.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = RESPONSE_GZIP_MIN_SIZE,
+                 compresslevel: int = RESPONSE_GZIP_LEVEL):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.enabled = minimum_size > 0
+
+    @staticmethod
+    def _is_stream(scope: Scope) -> bool:
+        if b'stream=' in scope.get('query_string', b''):
+            return True
+        for name, value in scope.get('headers', ()):
+            if name == b'accept' and (b'application/x-ndjson' in value or b'text/event-stream' in value):
+                return True
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope['type'] != 'http' or self._is_stream(scope):
+            await self.app(scope, receive, send)
+            return
+        await self.gzip(scope, receive, send)
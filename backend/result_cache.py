@@ -0,0 +1,185 @@
+"""Bounded TTL + LRU cache of scrape results with HTTP revalidation support"""
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config import env_float, env_int
+from models import ScrapeResult
+
+RESULT_CACHE_MAX_BYTES = env_int('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+RESULT_CACHE_MAX_ENTRIES = env_int('RESULT_CACHE_MAX_ENTRIES', 10000)
+# Seconds a result stays fresh, by the path that produced it
+RESULT_CACHE_STATIC_TTL = env_float('RESULT_CACHE_STATIC_TTL', 300.0)
+RESULT_CACHE_BROWSER_TTL = env_float('RESULT_CACHE_BROWSER_TTL', 1800.0)
+
+# Rough per-entry overhead on top of the stored strings
+_ENTRY_OVERHEAD_BYTES = 512
+_MAX_AGE = re.compile(r'max-age\s*=\s*"?(\d+)"?')
+
+
+@dataclass
+class CachePolicy:
+    """Per-request overrides parsed from a Cache-Control header"""
+    no_cache: bool = False   # skip the cached copy but store the fresh result
+    no_store: bool = False   # neither read nor write the cache
+    max_age: Optional[float] = None  # accept cached results at most this old
+
+    @property
+    def bypass(self) -> bool:
+        return self.no_cache or self.no_store
+
+
+def parse_cache_control(header: Optional[str]) -> CachePolicy:
+    """Parse the request directives the scrape endpoints honour"""
+    policy = CachePolicy()
+    if not header:
+        return policy
+    value = header.lower()
+    policy.no_store = 'no-store' in value
+    policy.no_cache = 'no-cache' in value
+    match = _MAX_AGE.search(value)
+    if match:
+        policy.max_age = float(match.group(1))
+    return policy
+
+
+@dataclass
+class ScrapeOrigin:
+    """How a fresh result was produced; filled in by the scrape path"""
+    path: str = 'static'  # 'static' or 'browser'
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # Body fetched by a revalidation that came back 200, reused instead of fetching twice
+    prefetched: Optional[object] = None
+
+
+@dataclass
+class CacheEntry:
+    result: ScrapeResult
+    path: str
+    stored_at: float
+    expires_at: float
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def is_fresh(self, max_age: Optional[float] = None) -> bool:
+        now = time.monotonic()
+        if now >= self.expires_at:
+            return False
+        return max_age is None or now - self.stored_at <= max_age
+
+    @property
+    def can_revalidate(self) -> bool:
+        # Browser renders have no validators worth trusting
+        return self.path == 'static' and bool(self.etag or self.last_modified)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def _estimate_size(result: ScrapeResult) -> int:
+    size = _ENTRY_OVERHEAD_BYTES + len(result.url)
+    component = result.authComponent
+    if component is not None:
+        for value in (
+            component.htmlSnippet,
+            component.formElement,
+            component.usernameInput,
+            component.passwordInput,
+            component.submitButton,
+            component.action,
+        ):
+            if value:
+                size += len(value)
+    return size
+
+
+class ResultCache:
+    """LRU ordered map bounded by both entry count and approximate bytes"""
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        static_ttl: float = RESULT_CACHE_STATIC_TTL,
+        browser_ttl: float = RESULT_CACHE_BROWSER_TTL,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttls = {'static': static_ttl, 'browser': browser_ttl}
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._bytes = 0
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'revalidated': 0,
+            'changed': 0,
+            'bypassed': 0,
+            'stores': 0,
+            'evictions': 0,
+        }
+
+    def count(self, name: str) -> None:
+        self.counters[name] += 1
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry (fresh or not) and mark it recently used"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, result: ScrapeResult, origin: ScrapeOrigin) -> None:
+        size = _estimate_size(result)
+        if size > self.max_bytes:
+            return
+        self.discard(key)
+        now = time.monotonic()
+        self._entries[key] = CacheEntry(
+            result=result,
+            path=origin.path,
+            stored_at=now,
+            expires_at=now + self.ttls.get(origin.path, self.ttls['static']),
+            size=size,
+            etag=origin.etag if origin.path == 'static' else None,
+            last_modified=origin.last_modified if origin.path == 'static' else None,
+        )
+        self._bytes += size
+        self.count('stores')
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.count('evictions')
+
+    def refresh(self, key: str) -> None:
+        """Restart an entry's TTL after a 304 Not Modified"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            entry.stored_at = now
+            entry.expires_at = now + self.ttls.get(entry.path, self.ttls['static'])
+
+    def discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'maxBytes': self.max_bytes,
+        }
@@ -0,0 +1,148 @@
+"""Per-domain choice between the static HTTP path and a browser render.
+
+Every scrape reports how each path it tried went (login form found, blocked,
+latency). Domains where static fetches keep failing but renders succeed go
+straight to the browser. Domains where renders never find more than the
+static page skip the render. A small share of scrapes ignores the history
+and takes the default path, so a domain whose behaviour changes is noticed.
+"""
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config import env_float, env_int
+
+# Share of decisions that ignore the history and take the default path
+ROUTING_EXPLORE_RATE = env_float('ROUTING_EXPLORE_RATE', 0.1)
+# Observations of a path before its history is trusted
+ROUTING_MIN_SAMPLES = env_int('ROUTING_MIN_SAMPLES', 3)
+# Weight of the newest observation in the moving averages
+ROUTING_ALPHA = env_float('ROUTING_ALPHA', 0.3)
+# Success rate below which a path counts as not working for a domain
+ROUTING_FAILURE_RATE = env_float('ROUTING_FAILURE_RATE', 0.2)
+ROUTING_MAX_DOMAINS = env_int('ROUTING_MAX_DOMAINS', 10000)
+
+PATHS = ('static', 'browser')
+
+
+@dataclass
+class PathStats:
+    attempts: int = 0
+    successes: int = 0
+    blocked: int = 0
+    # Moving averages, weighted towards recent scrapes
+    success_rate: float = 0.0
+    latency_ms: float = 0.0
+    last_seen: float = 0.0
+
+    def observe(self, success: bool, blocked: bool, latency_ms: float, alpha: float) -> None:
+        self.attempts += 1
+        self.successes += success
+        self.blocked += blocked
+        if self.attempts == 1:
+            self.success_rate = float(success)
+            self.latency_ms = latency_ms
+        else:
+            self.success_rate += alpha * (float(success) - self.success_rate)
+            self.latency_ms += alpha * (latency_ms - self.latency_ms)
+        self.last_seen = time.time()
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'blocked': self.blocked,
+            'successRate': round(self.success_rate, 3),
+            'latencyMs': round(self.latency_ms, 1),
+            'lastSeen': round(self.last_seen, 3),
+        }
+
+
+class Router:
+    """Learns per domain which path finds login forms, and how fast"""
+
+    def __init__(
+        self,
+        explore_rate: float = ROUTING_EXPLORE_RATE,
+        min_samples: int = ROUTING_MIN_SAMPLES,
+        alpha: float = ROUTING_ALPHA,
+        failure_rate: float = ROUTING_FAILURE_RATE,
+        max_domains: int = ROUTING_MAX_DOMAINS,
+    ):
+        self.explore_rate = explore_rate
+        self.min_samples = max(1, min_samples)
+        self.alpha = alpha
+        self.failure_rate = failure_rate
+        self.max_domains = max_domains
+        self._domains: 'OrderedDict[str, Dict[str, PathStats]]' = OrderedDict()
+        self.counters = {'static': 0, 'browser': 0, 'explored': 0, 'renderSkipped': 0}
+
+    def _history(self, domain: str) -> Optional[Dict[str, PathStats]]:
+        history = self._domains.get(domain)
+        if history is not None:
+            self._domains.move_to_end(domain)
+        return history
+
+    def _trusted(self, stats: PathStats) -> bool:
+        return stats.attempts >= self.min_samples
+
+    def _explore(self) -> bool:
+        if random.random() < self.explore_rate:
+            self.counters['explored'] += 1
+            return True
+        return False
+
+    def choose(self, domain: str) -> str:
+        """Path to start with: 'static' unless static keeps failing where the browser works"""
+        history = self._history(domain)
+        path = 'static'
+        if history is not None:
+            static, browser = history['static'], history['browser']
+            if (
+                self._trusted(static) and self._trusted(browser)
+                and static.success_rate < self.failure_rate
+                and browser.success_rate > static.success_rate
+                and not self._explore()
+            ):
+                path = 'browser'
+        self.counters[path] += 1
+        return path
+
+    def should_render(self, domain: str) -> bool:
+        """Whether escalating to the browser is worth it after an unsuccessful static fetch"""
+        history = self._history(domain)
+        if history is None:
+            return True
+        browser = history['browser']
+        if self._trusted(browser) and browser.success_rate < self.failure_rate and not self._explore():
+            self.counters['renderSkipped'] += 1
+            return False
+        return True
+
+    def observe(self, domain: str, path: str, success: bool, latency_ms: float, blocked: bool = False) -> None:
+        """Record how one path went for a domain"""
+        if not domain:
+            return
+        history = self._history(domain)
+        if history is None:
+            history = {name: PathStats() for name in PATHS}
+            self._domains[domain] = history
+            while len(self._domains) > self.max_domains:
+                self._domains.popitem(last=False)
+        history[path].observe(success, blocked, latency_ms, self.alpha)
+
+    def stats(self, domain: Optional[str] = None) -> Dict[str, object]:
+        if domain is not None:
+            domains = {domain: self._domains[domain]} if domain in self._domains else {}
+        else:
+            domains = self._domains
+        return {
+            'decisions': dict(self.counters),
+            'trackedDomains': len(self._domains),
+            'domains': {
+                name: {path: stats.to_dict() for path, stats in history.items()}
+                for name, history in domains.items()
+            },
+        }
@@ -0,0 +1,57 @@
+"""Request coalescing: concurrent calls for the same key share one in-flight task"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one task per key; later callers await the same task.
+
+    The shared task is shielded from any single waiter's cancellation (a
+    client disconnecting), and is only cancelled once every waiter is gone.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.counters = {'started': 0, 'coalesced': 0, 'abandoned': 0}
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._task_done(key, call, task))
+            self.counters['started'] += 1
+        else:
+            self.counters['coalesced'] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left to receive the result
+                self._forget(key, call)
+                call.task.cancel()
+                self.counters['abandoned'] += 1
+
+    def _task_done(self, key: str, call: _Call, task: asyncio.Task) -> None:
+        self._forget(key, call)
+        if not task.cancelled():
+            # Mark the exception as retrieved; waiters (if any) re-raise it themselves
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, 'inFlight': len(self._calls)}
@@ -0,0 +1,183 @@
+"""Detector as it shipped before the single-pass rewrite, kept as the parity reference.
+
+Copied verbatim from the original main.py; do not "fix" it. Quirks in here
+(such as the submit class matcher accepting any class) are part of the
+behaviour the detector promises to keep.
+"""
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from models import AuthComponent
+
+
+def detect_auth_components(html: str, base_url: str) -> AuthComponent:
+    """Detect authentication components in web pages with enhanced HTML parsing"""
+    soup = BeautifulSoup(html, 'lxml')
+
+    # Find password input fields
+    password_inputs = soup.find_all('input', {'type': 'password'})
+
+    if not password_inputs:
+        return AuthComponent(found=False)
+
+    # Find the nearest parent form containing the password input
+    auth_form = None
+    form_element = None
+
+    for password_input in password_inputs:
+        # First, try to find parent form
+        form = password_input.find_parent('form')
+
+        if form:
+            auth_form = form
+            form_element = form
+            break
+
+        # If no form tag found, search more broadly for containers with authentication elements
+        # Look for divs, sections, or other containers that might contain login forms
+        parent = password_input.parent
+        max_depth = 10  # Limit search depth
+        depth = 0
+
+        while parent and parent.name and parent.name != 'body' and depth < max_depth:
+            depth += 1
+
+            # Check for username/email inputs in the same container
+            # Look for various patterns: type, name, id, placeholder, aria-label
+            username_patterns = [
+                {'type': 'text'},
+                {'type': 'email'},
+                {'name': lambda x: x and any(k in x.lower() for k in ['user', 'login', 'email', 'account', 'phone'])},
+                {'id': lambda x: x and any(k in x.lower() for k in ['user', 'login', 'email', 'account', 'phone'])},
+                {'placeholder': lambda x: x and any(k in x.lower() for k in ['email', 'phone', 'user', 'account'])},
+                {'aria-label': lambda x: x and any(k in x.lower() for k in ['email', 'phone', 'user', 'account'])},
+            ]
+
+            username_found = False
+            for pattern in username_patterns:
+                if parent.find('input', pattern):
+                    username_found = True
+                    break
+
+            # Also check for password input in the same container
+            password_found = parent.find('input', {'type': 'password'}) is not None
+
+            # If we found both username and password in the same container, this is likely an auth form
+            if username_found and password_found:
+                auth_form = parent
+                form_element = parent
+                break
+
+            # Also check for common authentication container classes/ids
+            container_attrs = parent.attrs if hasattr(parent, 'attrs') else {}
+            class_names = ' '.join(container_attrs.get('class', [])).lower() if 'class' in container_attrs else ''
+            container_id = container_attrs.get('id', '').lower() if 'id' in container_attrs else ''
+
+            auth_keywords = ['login', 'signin', 'sign-in', 'auth', 'authentication', 'form']
+            if any(keyword in class_names or keyword in container_id for keyword in auth_keywords):
+                if password_found:
+                    auth_form = parent
+                    form_element = parent
+                    break
+
+            parent = parent.parent
+
+    # If still no form found, try to find the closest meaningful container
+    if not auth_form:
+        first_password = password_inputs[0]
+        # Try to find a container div that likely contains the form
+        parent = first_password.parent
+        for _ in range(5):  # Go up to 5 levels
+            if parent and parent.name:
+                # Check if this container has multiple inputs (likely a form)
+                all_inputs = parent.find_all('input')
+                if len(all_inputs) >= 2:  # At least username and password
+                    auth_form = parent
+                    form_element = parent
+                    break
+            if parent:
+                parent = parent.parent
+            else:
+                break
+
+        # Last resort: use password input's parent container
+        if not auth_form:
+            if first_password.parent:
+                auth_form = first_password.parent.parent if first_password.parent.parent else first_password.parent
+            else:
+                auth_form = first_password
+
+    # Extract form-related information with enhanced patterns
+    username_input = None
+    if auth_form:
+        # Try multiple patterns to find username input
+        username_patterns = [
+            {'type': 'text'},
+            {'type': 'email'},
+            {'type': 'tel'},  # Phone number
+            {'name': lambda x: x and any(k in x.lower() for k in ['user', 'login', 'email', 'account', 'phone', 'mobile'])},
+            {'id': lambda x: x and any(k in x.lower() for k in ['user', 'login', 'email', 'account', 'phone', 'mobile'])},
+            {'placeholder': lambda x: x and any(k in x.lower() for k in ['email', 'phone', 'user', 'account', 'username'])},
+            {'aria-label': lambda x: x and any(k in x.lower() for k in ['email', 'phone', 'user', 'account'])},
+            {'autocomplete': lambda x: x and any(k in x.lower() for k in ['username', 'email', 'tel'])},
+        ]
+
+        for pattern in username_patterns:
+            found = auth_form.find('input', pattern)
+            if found:
+                username_input = found
+                break
+
+    password_input = auth_form.find('input', {'type': 'password'}) if auth_form else None
+
+    # Enhanced submit button detection
+    submit_button = None
+    if auth_form:
+        submit_patterns = [
+            {'type': 'submit'},
+            {'type': 'button', 'class': lambda x: x and any(k in ' '.join(x).lower() if isinstance(x, list) else str(x).lower() for k in ['submit', 'login', 'sign'])},
+            {'type': 'button', 'id': lambda x: x and any(k in x.lower() for k in ['submit', 'login', 'sign'])},
+            {'type': 'button', 'name': lambda x: x and any(k in x.lower() for k in ['submit', 'login', 'sign'])},
+        ]
+
+        for pattern in submit_patterns:
+            found = auth_form.find('input', pattern) or auth_form.find('button', pattern)
+            if found:
+                submit_button = found
+                break
+
+        # Also check button text content
+        if not submit_button:
+            buttons = auth_form.find_all('button')
+            for button in buttons:
+                text = button.get_text().lower() if button.get_text() else ''
+                if any(k in text for k in ['sign in', 'login', 'log in', 'submit', 'continue', 'next']):
+                    submit_button = button
+                    break
+
+    # Get form method and action
+    method = 'GET'
+    action = base_url
+
+    if form_element and hasattr(form_element, 'get'):
+        method = form_element.get('method', 'GET').upper()
+        action_attr = form_element.get('action', '')
+        if action_attr:
+            try:
+                action = urljoin(base_url, action_attr)
+            except:
+                action = base_url
+        else:
+            action = base_url
+
+    return AuthComponent(
+        found=True,
+        htmlSnippet=str(auth_form).strip() if auth_form else '',
+        formElement=str(form_element).strip() if form_element else '',
+        usernameInput=str(username_input).strip() if username_input else '',
+        passwordInput=str(password_input).strip() if password_input else '',
+        submitButton=str(submit_button).strip() if submit_button else '',
+        method=method,
+        action=action,
+    )
@@ -0,0 +1,102 @@
+"""Leases must give their slot back however the scrape or the reset ends.
+
+Runs against stand-in browser objects, so no browser binaries are needed.
+
+    cd backend && python -m unittest discover tests
+"""
+import asyncio
+import unittest
+
+from browser_pool import BrowserContextPool
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+        # Set to an Event to make new_page() hang until it is set
+        self.new_page_gate = None
+
+    async def route(self, pattern, handler) -> None:
+        pass
+
+    def on(self, event, handler) -> None:
+        pass
+
+    async def new_page(self) -> FakePage:
+        if self.new_page_gate is not None:
+            await self.new_page_gate.wait()
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+    async def clear_cookies(self) -> None:
+        pass
+
+    async def clear_permissions(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    async def new_context(self, **options) -> FakeContext:
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+
+class LeaseTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.browser = FakeBrowser()
+        self.pool = BrowserContextPool(self.browser, size=1, acquire_timeout=1.0, max_uses=10)
+
+    async def test_reused_after_clean_lease(self):
+        async with self.pool.lease():
+            pass
+        self.assertEqual(self.pool.stats()['inUse'], 0)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+        async with self.pool.lease():
+            pass
+        self.assertEqual(len(self.browser.contexts), 1)
+
+    async def test_cancel_during_reset_frees_slot(self):
+        reset_started = asyncio.Event()
+
+        async def scrape():
+            async with self.pool.lease() as entry:
+                entry.context.new_page_gate = asyncio.Event()
+                reset_started.set()
+
+        task = asyncio.create_task(scrape())
+        await reset_started.wait()
+        # Let the lease exit and block inside _reset's new_page()
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertEqual(self.pool.stats(), {'size': 1, 'inUse': 0, 'idle': 0, 'waiting': 0})
+        self.assertTrue(self.browser.contexts[0].closed)
+        # The slot is free again: a new lease gets a fresh context right away
+        async with self.pool.lease() as entry:
+            self.assertIs(entry.context, self.browser.contexts[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""Per-scrape timing recorder carried through async calls via a context variable"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+_current: ContextVar[Optional[Dict[str, float]]] = ContextVar('scrape_timings', default=None)
+
+
+@contextmanager
+def recording():
+    """Collect timings (in milliseconds) recorded anywhere inside the block"""
+    timings: Dict[str, float] = {}
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record(name: str, elapsed_ms: float) -> None:
+    """Add a duration to the active recorder; repeated names accumulate"""
+    timings = _current.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0.0) + elapsed_ms, 1)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block and record it under `name`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - started) * 1000)
@@ -0,0 +1,49 @@
+"""URL helpers shared by the cache, request coalescing, scheduling and rendering layers"""
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """Canonical form of a URL for use as a lookup key.
+
+    Mirrors scrape_website's handling of scheme-less input (https is
+    assumed), lowercases scheme and host, drops default ports and the
+    fragment, and uses "/" for an empty path. Returns None if the URL has
+    no host.
+    """
+    url = url.strip()
+    try:
+        if not urlsplit(url).scheme:
+            url = f"https://{url}"
+        parts = urlsplit(url)
+        host = parts.hostname
+        port = parts.port
+    except ValueError:
+        return None
+    if not host:
+        return None
+
+    scheme = parts.scheme.lower()
+    netloc = host.lower()
+    if ':' in netloc:
+        netloc = f"[{netloc}]"
+    if port is not None and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def domain_of(url: str) -> str:
+    """Lowercased host of a URL ('' if it has none)"""
+    try:
+        return (urlsplit(url if '://' in url else f"https://{url}").hostname or '').lower()
+    except ValueError:
+        return ''
+
+
+def is_login_url(url: str) -> bool:
+    """Check if URL appears to be a login/signin page"""
+    url_lower = url.lower()
+    login_keywords = ['login', 'signin', 'sign-in', 'sign_in', 'auth', 'authenticate', 'log-in']
+    return any(keyword in url_lower for keyword in login_keywords)
@@ -0,0 +1,283 @@
+"""Watched URLs whose results are refreshed in the background and served from snapshots.
+
+Each watched URL is re-scraped every WATCHLIST_INTERVAL seconds (spread by
+WATCHLIST_JITTER so refreshes do not line up). Reads never wait for a scrape
+once a snapshot exists: a stale snapshot is served as is and a refresh is
+started behind it. Only the first read of a URL with no snapshot yet waits.
+
+URLs registered through the API are kept in SQLite next to the discovery
+cache, so they survive restarts and every uvicorn worker picks them up.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import env_float, env_int, env_list, env_str
+from models import ScrapeResult
+from urls import normalize_url
+
+# URLs watched from startup; /api/predefined serves these
+PREDEFINED_URLS = [
+    'https://github.com/login',
+    'https://stackoverflow.com/users/login',
+    'https://www.linkedin.com/login',
+    'https://www.quora.com/login',
+    'https://www.dropbox.com/login',
+]
+# Unlike other list settings, an empty value means no URLs rather than the default
+_WATCHLIST_URLS_SET = os.getenv('WATCHLIST_URLS')
+WATCHLIST_URLS = (
+    [] if _WATCHLIST_URLS_SET is not None and not _WATCHLIST_URLS_SET.strip()
+    else env_list('WATCHLIST_URLS', PREDEFINED_URLS)
+)
+# Seconds between refreshes of each URL, and the +/- share of it added at random
+WATCHLIST_INTERVAL = env_float('WATCHLIST_INTERVAL', 600.0)
+WATCHLIST_JITTER = env_float('WATCHLIST_JITTER', 0.1)
+# Refreshes running at once
+WATCHLIST_CONCURRENCY = env_int('WATCHLIST_CONCURRENCY', 2)
+WATCHLIST_MAX_URLS = env_int('WATCHLIST_MAX_URLS', 100)
+WATCHLIST_DB_PATH = env_str(
+    'WATCHLIST_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'watchlist.sqlite3'),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watched_urls (
+    url TEXT PRIMARY KEY,
+    added_at REAL NOT NULL
+)
+"""
+
+
+class WatchlistFull(Exception):
+    """Raised when registering more URLs than WATCHLIST_MAX_URLS"""
+
+
+@dataclass
+class Snapshot:
+    result: ScrapeResult
+    refreshed_at: float  # wall clock, for display
+    refreshed_mono: float
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.refreshed_mono
+
+
+class WatchedUrl:
+    def __init__(self, url: str, source: str):
+        self.url = url
+        self.source = source  # 'config' or 'api'
+        self.snapshot: Optional[Snapshot] = None
+        self.next_refresh = time.monotonic()
+        self.refreshing: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        snapshot = self.snapshot
+        return {
+            'url': self.url,
+            'source': self.source,
+            'ageSeconds': round(snapshot.age, 1) if snapshot else None,
+            'refreshedAt': round(snapshot.refreshed_at, 3) if snapshot else None,
+            'nextRefreshIn': round(max(0.0, self.next_refresh - time.monotonic()), 1),
+            'refreshing': self.refreshing is not None,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'lastError': self.last_error,
+        }
+
+
+class Watchlist:
+    """Keeps a snapshot per watched URL and refreshes it on a jittered schedule"""
+
+    def __init__(
+        self,
+        scrape: Callable[[str], Awaitable[ScrapeResult]],
+        urls: List[str] = WATCHLIST_URLS,
+        interval: float = WATCHLIST_INTERVAL,
+        jitter: float = WATCHLIST_JITTER,
+        concurrency: int = WATCHLIST_CONCURRENCY,
+        max_urls: int = WATCHLIST_MAX_URLS,
+        path: str = WATCHLIST_DB_PATH,
+    ):
+        self.scrape = scrape
+        self.interval = max(1.0, interval)
+        self.jitter = min(max(0.0, jitter), 1.0)
+        self.max_urls = max_urls
+        self.path = path
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._entries: Dict[str, WatchedUrl] = {}
+        self._initialized = False
+        self._wake = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self.counters = {'served': 0, 'stale': 0, 'waited': 0, 'refreshes': 0, 'failures': 0}
+        for url in urls:
+            key = normalize_url(url)
+            if key:
+                self._entries.setdefault(key, WatchedUrl(url, 'config'))
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _load(self) -> List[str]:
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute('SELECT url FROM watched_urls ORDER BY added_at')]
+        finally:
+            conn.close()
+
+    def _save(self, urls: List[str]) -> None:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.executemany('INSERT OR IGNORE INTO watched_urls (url, added_at) VALUES (?, ?)', [(url, now) for url in urls])
+            conn.commit()
+        finally:
+            conn.close()
+
+    async def _sync(self) -> None:
+        """Pick up URLs registered here or by other worker processes"""
+        try:
+            stored = await asyncio.to_thread(self._load)
+        except sqlite3.Error as e:
+            print(f"Watchlist load failed: {e}")
+            return
+        for url in stored:
+            key = normalize_url(url)
+            if key and key not in self._entries:
+                self._entries[key] = WatchedUrl(url, 'api')
+
+    def _schedule(self, entry: WatchedUrl) -> None:
+        spread = self.interval * self.jitter
+        entry.next_refresh = time.monotonic() + self.interval + random.uniform(-spread, spread)
+
+    async def _refresh(self, entry: WatchedUrl) -> None:
+        async with self._slots:
+            try:
+                result = await self.scrape(entry.url)
+            except Exception as e:
+                result = ScrapeResult(url=entry.url, success=False, error=str(e) or type(e).__name__)
+        entry.refreshes += 1
+        self.counters['refreshes'] += 1
+        # A failed refresh keeps serving the last good snapshot
+        if result.success or entry.snapshot is None or not entry.snapshot.result.success:
+            entry.snapshot = Snapshot(result, time.time(), time.monotonic())
+        if result.success:
+            entry.last_error = None
+        else:
+            entry.failures += 1
+            self.counters['failures'] += 1
+            entry.last_error = result.error
+            print(f"Watchlist refresh failed for {entry.url}: {result.error}")
+        self._schedule(entry)
+
+    def _start_refresh(self, entry: WatchedUrl) -> asyncio.Task:
+        if entry.refreshing is None:
+            task = asyncio.create_task(self._refresh(entry))
+            entry.refreshing = task
+
+            def done(_task: asyncio.Task, entry: WatchedUrl = entry) -> None:
+                entry.refreshing = None
+                self._wake.set()
+            task.add_done_callback(done)
+        return entry.refreshing
+
+    async def _run(self) -> None:
+        while True:
+            await self._sync()
+            now = time.monotonic()
+            for entry in list(self._entries.values()):
+                if entry.refreshing is None and entry.next_refresh <= now:
+                    self._start_refresh(entry)
+            upcoming = [entry.next_refresh for entry in self._entries.values() if entry.refreshing is None]
+            # Wake for the next due URL, and at least every few seconds to notice other workers' registrations
+            delay = min([self.interval, 5.0] + [max(0.0, due - time.monotonic()) for due in upcoming])
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.05, delay))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for entry in self._entries.values():
+            if entry.refreshing:
+                entry.refreshing.cancel()
+
+    async def add(self, urls: List[str]) -> List[str]:
+        """Watch more URLs; returns the ones that were not watched yet"""
+        added: Dict[str, str] = {}
+        for url in urls:
+            key = normalize_url(url)
+            if key is None:
+                raise ValueError(f"Invalid URL: {url}")
+            if key not in self._entries:
+                added.setdefault(key, url)
+        if len(self._entries) + len(added) > self.max_urls:
+            raise WatchlistFull(f"The watch list holds at most {self.max_urls} URLs")
+        if added:
+            try:
+                await asyncio.to_thread(self._save, list(added.values()))
+            except sqlite3.Error as e:
+                print(f"Watchlist store failed: {e}")
+        for key, url in added.items():
+            entry = WatchedUrl(url, 'api')
+            self._entries[key] = entry
+            self._start_refresh(entry)
+        return list(added.values())
+
+    async def get(self, url: str) -> Optional[Snapshot]:
+        """Latest snapshot of a watched URL (None if it is not watched).
+
+        Stale snapshots are returned immediately and refreshed in the
+        background; only a URL without any snapshot waits for its scrape.
+        """
+        entry = self._entries.get(normalize_url(url) or '')
+        if entry is None:
+            return None
+        self.counters['served'] += 1
+        if entry.snapshot is None:
+            self.counters['waited'] += 1
+            await asyncio.shield(self._start_refresh(entry))
+        elif self.is_stale(entry.snapshot):
+            self.counters['stale'] += 1
+            # Not before it is due, so a failing site is not re-scraped on every read
+            if entry.next_refresh <= time.monotonic():
+                self._start_refresh(entry)
+        return entry.snapshot
+
+    def is_stale(self, snapshot: Snapshot) -> bool:
+        return snapshot.age > self.interval
+
+    def urls(self) -> List[str]:
+        return [entry.url for entry in self._entries.values()]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self.counters,
+            'interval': self.interval,
+            'urls': [entry.to_dict() for entry in self._entries.values()],
+        }